@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from celery.schedules import crontab
 
@@ -25,6 +26,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'silk.middleware.SilkyMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'trade.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,8 +65,20 @@ DATABASES = {
     }
 }
 
+# "default" keeps hot keys in an in-process LRU for a few seconds in front
+# of Redis (see trade/cache_backends.py); use caches["shared"] to skip it.
 CACHES = {
     "default": {
+        "BACKEND": "trade.cache_backends.TwoTierCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            "LOCAL_TIMEOUT": 5,
+            "VERSION_CHECK_INTERVAL": 1,
+            "MAX_ENTRIES": 1000,
+            "MAX_BYTES": 8 * 1024 * 1024,
+        }
+    },
+    "shared": {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": "redis://127.0.0.1:6379/1",
         "OPTIONS": {
@@ -76,10 +90,13 @@ CACHES = {
 from celery.schedules import crontab
 
 CELERY_BEAT_SCHEDULE = {
+    # refresh: a finished report would otherwise be returned as it is
+    # forever. A tick that finds the previous run still going does nothing.
     'generate-report-every-minute': {
         'task': 'trade.tasks.generate_report',
         'schedule': 60.0,
-        'args': ('123',),
+        'args': ('scheduled-monthly',),
+        'kwargs': {'refresh': True},
     },
 }
 
@@ -116,3 +133,9 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 CELERY_RESULT_EXPIRES = 3600  
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+# Request metrics at /metrics (see trade/metrics.py). With several worker
+# processes, point METRICS_DIR at a directory they share and empty it
+# when the server restarts.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
@@ -2,9 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 import debug_toolbar
 
+from trade.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('__debug__/', include(debug_toolbar.urls)),
     path('silk/', include('silk.urls', namespace='silk')),
     path('api/', include('trade.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
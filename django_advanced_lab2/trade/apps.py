@@ -2,3 +2,6 @@ from django.apps import AppConfig
 
 class TradeConfig(AppConfig):
     name = 'trade'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,303 @@
+import fnmatch
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+# A counter of writes, and under CHANGE_KEY.format(n) the local key the
+# n-th write changed.
+VERSION_KEY = "two-tier:version"
+CHANGE_KEY = "two-tier:change:{}"
+# Seconds a change stays readable. A process that looks later than that
+# can't tell what changed and drops its whole local tier instead.
+CHANGE_TIMEOUT = 60
+# A process further behind than this drops its whole local tier too,
+# rather than reading that many changes.
+MAX_CHANGES = 1000
+
+# Local stores are per process, shared by every thread (Django builds one
+# cache object per thread), like LocMemCache's.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class _LocalStore:
+    """Size-bounded LRU of pickled values, tagged with the shared version."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (expires_at, pickled)
+        self.size = 0
+        self.version = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._pop(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, pickled, ttl):
+        with self.lock:
+            self._pop(key)
+            if len(pickled) > self.max_bytes:
+                return
+            self.entries[key] = (time.monotonic() + ttl, pickled)
+            self.size += len(pickled)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def touch(self, key, ttl):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            if ttl > 0:
+                self.entries[key] = (time.monotonic() + ttl, entry[1])
+            else:
+                self._pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class TwoTierCache(BaseCache):
+    """
+    An in-process LRU in front of another cache backend.
+
+    LOCATION is the alias of the shared cache (e.g. Redis). Reads are
+    answered from the local LRU while the entry is younger than
+    LOCAL_TIMEOUT, so a hot key costs a dict lookup instead of a network
+    round-trip; misses fall through to the shared cache and are kept
+    locally. Writes go to the shared cache first.
+
+    Other processes learn about writes through a log in the shared cache:
+    every set/delete/incr bumps a version counter and records the key it
+    changed under the new version. Each process reads the counter at most
+    once per VERSION_CHECK_INTERVAL and, when it has moved, the keys
+    written since it last looked, and drops only those from its local
+    tier. A value written elsewhere is therefore seen after at most
+    min(LOCAL_TIMEOUT, VERSION_CHECK_INTERVAL) seconds. Only when the log
+    can't tell (entries expired or evicted, too far behind, clear()) is
+    the whole local tier dropped.
+
+    Keys matching one of the SHARED_ONLY patterns (fnmatch, default
+    "*:lock" for the locks of trade.caching.get_or_compute) bypass the
+    local tier: they are never kept locally, so writing them logs
+    nothing. add() logs nothing either: it can only succeed for a key
+    nobody has.
+
+    The local tier is bounded by MAX_ENTRIES and by MAX_BYTES of pickled
+    data; values bigger than that are never kept locally.
+
+        CACHES = {
+            "default": {
+                "BACKEND": "trade.cache_backends.TwoTierCache",
+                "LOCATION": "shared",
+                "OPTIONS": {"LOCAL_TIMEOUT": 5, "MAX_BYTES": 8 * 1024 * 1024},
+            },
+            "shared": {"BACKEND": "django_redis.cache.RedisCache", ...},
+        }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.shared_alias = location
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        self.version_check_interval = options.get("VERSION_CHECK_INTERVAL", 1)
+        self.shared_only = tuple(options.get("SHARED_ONLY", ("*:lock",)))
+        limits = (options.get("MAX_ENTRIES", 1000), options.get("MAX_BYTES", 8 * 1024 * 1024))
+        with _stores_lock:
+            self.local = _stores.setdefault((location, *limits), _LocalStore(*limits))
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_key(self, key, version):
+        return self.shared.make_and_validate_key(key, version=version)
+
+    def _is_local(self, key):
+        return not any(fnmatch.fnmatchcase(key, pattern) for pattern in self.shared_only)
+
+    def _local_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(self.local_timeout, timeout)
+
+    def _sync_version(self):
+        now = time.monotonic()
+        if now - self.local.checked_at < self.version_check_interval:
+            return
+        seen = self.local.version
+        version = self.shared.get(VERSION_KEY)
+        if version != seen:
+            if (seen is None or version is None or not 0 < version - seen <= MAX_CHANGES
+                    or now - self.local.checked_at > CHANGE_TIMEOUT):
+                self.local.clear()
+            else:
+                keys = [CHANGE_KEY.format(n) for n in range(seen + 1, version + 1)]
+                changed = self.shared.get_many(keys)
+                if len(changed) < len(keys):
+                    # Expired, evicted, or its writer hasn't recorded it yet.
+                    self.local.clear()
+                for local_key in changed.values():
+                    self.local.delete(local_key)
+            self.local.version = version
+        self.local.checked_at = now
+
+    def _log_change(self, *local_keys):
+        """Tell the other processes to drop `local_keys` from their local tier."""
+        if not local_keys:
+            return
+        # Catch up first, so that our own change usually comes right next.
+        self._sync_version()
+        try:
+            version = self.shared.incr(VERSION_KEY, len(local_keys))
+        except ValueError:
+            # Starting from the clock means an evicted counter never comes
+            # back at a value some process still holds.
+            version = time.time_ns()
+            self.shared.set(VERSION_KEY, version, None)
+        first = version - len(local_keys) + 1
+        self.shared.set_many(
+            {CHANGE_KEY.format(first + i): local_key for i, local_key in enumerate(local_keys)},
+            CHANGE_TIMEOUT,
+        )
+        # Our own local tier already reflects these writes. If nobody else
+        # wrote since we last looked, there is nothing to read back.
+        if self.local.version is not None and first == self.local.version + 1:
+            self.local.version = version
+
+    def _remember(self, key, local_key, value, timeout=DEFAULT_TIMEOUT):
+        ttl = self._local_ttl(timeout)
+        if ttl > 0 and self._is_local(key):
+            self.local.set(local_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        self._sync_version()
+        pickled = self.local.get(local_key)
+        if pickled is not None:
+            metrics.cache_get(key, hit=True)
+            return pickle.loads(pickled)
+        missing = object()
+        value = self.shared.get(key, missing, version=version)
+        metrics.cache_get(key, hit=value is not missing)
+        if value is missing:
+            return default
+        self._remember(key, local_key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        self.shared.set(key, value, timeout, version=version)
+        if self._is_local(key):
+            self._log_change(local_key)
+        self._remember(key, local_key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.add(key, value, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        touched = self.shared.touch(key, timeout, version=version)
+        ttl = self._local_ttl(timeout)
+        self.local.touch(local_key, ttl if touched else 0)
+        # Other processes' copies only outlive the key if it now expires
+        # sooner than they do.
+        if self._is_local(key) and ttl < self.local_timeout:
+            self._log_change(local_key)
+        return touched
+
+    def delete(self, key, version=None):
+        local_key = self._local_key(key, version)
+        self.local.delete(local_key)
+        deleted = self.shared.delete(key, version=version)
+        if self._is_local(key):
+            self._log_change(local_key)
+        return deleted
+
+    def has_key(self, key, version=None):
+        self._sync_version()
+        if self.local.get(self._local_key(key, version)) is not None:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self._local_key(key, version)
+        self.local.delete(local_key)
+        value = self.shared.incr(key, delta, version=version)
+        if self._is_local(key):
+            self._log_change(local_key)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync_version()
+        found, missing = {}, []
+        for key in keys:
+            pickled = self.local.get(self._local_key(key, version))
+            if pickled is not None:
+                found[key] = pickle.loads(pickled)
+            else:
+                missing.append(key)
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._remember(key, self._local_key(key, version), value)
+            found.update(fetched)
+        for key in keys:
+            metrics.cache_get(key, hit=key in found)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self._log_change(*(self._local_key(key, version) for key in data if self._is_local(key)))
+        for key, value in data.items():
+            if key not in failed:
+                self._remember(key, self._local_key(key, version), value, timeout)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.local.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version=version)
+        self._log_change(*(self._local_key(key, version) for key in keys if self._is_local(key)))
+
+    def clear(self):
+        # Takes the log with it: every other process finds a counter it
+        # can't follow and drops its whole local tier.
+        self.local.clear()
+        self.shared.clear()
+        self.local.version = time.time_ns()
+        self.shared.set(VERSION_KEY, self.local.version, None)
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
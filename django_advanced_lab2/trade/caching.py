@@ -0,0 +1,95 @@
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache as default_cache
+
+# How long an expired value may still be served while one worker recomputes it.
+STALE_TTL = 300
+# Upper bound on a recompute; a crashed worker's lock frees itself after
+# this, and one waiter takes over.
+LOCK_TIMEOUT = 30
+WAIT_INTERVAL = 0.05
+
+
+def get_or_compute(key, compute, timeout, stale_ttl=STALE_TTL, beta=1.0,
+                   lock_timeout=LOCK_TIMEOUT, cache=None):
+    """
+    Cached value of `key`, running `compute()` at most once at a time.
+
+    The plain get -> compute -> set pattern lets every request that misses
+    run the computation at once when a hot key expires (a cache stampede).
+    Here:
+
+    - single flight: only the worker that wins a cache.add() lock computes;
+    - stale-while-revalidate: the value stays in the cache for `stale_ttl`
+      seconds after `timeout`, and while someone recomputes it the other
+      workers keep serving that stale copy instead of waiting;
+    - probabilistic early refresh ("XFetch"): shortly before `timeout`
+      each read has a growing chance to recompute early, weighted by how
+      long the computation took last time (`beta` > 1 refreshes earlier),
+      so a busy key is usually refreshed before it ever goes stale.
+
+    Only a cold key (nothing cached at all) makes the other workers wait,
+    polling until the value appears. A lock whose holder is stuck or gone
+    expires after `lock_timeout`; the first waiter to take it over then
+    computes, and the others keep waiting for it.
+    """
+    cache = cache or default_cache
+    lock_key = f"{key}:lock"
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        now = time.time()
+        # -log(random()) is exponentially distributed: usually small, so
+        # early refreshes cluster just before `expires`.
+        if now - delta * beta * math.log(random.random() or 1e-12) < expires:
+            return value
+        token = _acquire(cache, lock_key, lock_timeout)
+        if token is None:
+            return value
+        return _recompute(cache, key, lock_key, token, compute, timeout, stale_ttl, seen=entry)
+
+    token = _acquire(cache, lock_key, lock_timeout)
+    while token is None:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        token = _acquire(cache, lock_key, lock_timeout)
+    return _recompute(cache, key, lock_key, token, compute, timeout, stale_ttl)
+
+
+def _acquire(cache, lock_key, lock_timeout):
+    """A token that owns the lock, or None if someone else holds it."""
+    token = uuid.uuid4().hex
+    return token if cache.add(lock_key, token, lock_timeout) else None
+
+
+def _release(cache, lock_key, token):
+    # If our compute outlived lock_timeout, the lock may be someone else's
+    # by now; leave theirs alone. (Not atomic: a lock that expires and is
+    # taken over between the get and the delete is still deleted.)
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _recompute(cache, key, lock_key, token, compute, timeout, stale_ttl, seen=None):
+    try:
+        # Another worker may have stored a newer value between our read
+        # (`seen`) and taking the lock.
+        entry = cache.get(key)
+        if entry is not None and (seen is None or entry[1] > seen[1]):
+            return entry[0]
+        return _store(cache, key, compute, timeout, stale_ttl)
+    finally:
+        _release(cache, lock_key, token)
+
+
+def _store(cache, key, compute, timeout, stale_ttl):
+    start = time.time()
+    value = compute()
+    delta = time.time() - start
+    cache.set(key, (value, time.time() + timeout, delta), timeout + stale_ttl)
+    return value
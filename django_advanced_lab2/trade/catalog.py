@@ -0,0 +1,44 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .caching import get_or_compute
+from .models import Product
+
+VERSION_KEY = "catalog:version"
+BODY_KEY = "catalog:body:{}"
+# Bodies are keyed by version, so they never need to expire to stay correct.
+BODY_TIMEOUT = 60 * 60 * 24
+
+
+def catalog_version():
+    """Version of the product catalog; it changes with every Product write."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Unknown (cold or evicted cache): start a new version, since we
+        # can't tell what changed before.
+        version = time.time_ns()
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def render_catalog():
+    products = list(
+        Product.objects.order_by("productID").values("productID", "productName", "unitPrice")
+    )
+    return json.dumps(
+        {"count": len(products), "products": products},
+        cls=DjangoJSONEncoder, separators=(",", ":"),
+    ).encode()
+
+
+def catalog_body(version):
+    """The catalog as ready-to-send JSON bytes, rendered once per version."""
+    return get_or_compute(BODY_KEY.format(version), render_catalog, timeout=BODY_TIMEOUT)
@@ -0,0 +1,61 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    HTTP conditional GET for the list and retrieve actions of a viewset.
+
+    Before anything is loaded or serialized, one aggregate query computes
+    Max() of every field in `validator_fields` plus Count() over the
+    filtered queryset (or over the single object for retrieve). A client
+    whose If-None-Match still matches gets a 304 right there. Full
+    responses carry the ETag and a Cache-Control header that lets a reverse
+    proxy store them and revalidate with it.
+
+    List the updated_at of every related model the serializer reads, so
+    renaming a category changes the ETag of its products. The count catches
+    deletes, which leave no newer updated_at behind; for the same reason no
+    Last-Modified is sent.
+    """
+    validator_fields = ('updated_at',)
+    cache_max_age = 0
+
+    def get_validator_state(self, queryset):
+        aggregates = {f'max_{i}': Max(field) for i, field in enumerate(self.validator_fields)}
+        state = queryset.order_by().aggregate(count=Count('pk'), **aggregates)
+        return sorted(state.items())
+
+    def get_etag(self, request, queryset):
+        key = '|'.join([
+            f'{type(self).__module__}.{type(self).__qualname__}',
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            repr(self.get_validator_state(queryset)),
+        ])
+        return 'W/' + quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def conditional(self, request, queryset, render):
+        etag = self.get_etag(request, queryset)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = render()
+            if response.status_code != 200:
+                return response
+            response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=self.cache_max_age, must_revalidate=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional(request, queryset, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return self.conditional(request, queryset, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,99 @@
+"""
+Recording the SQL that a block of code runs, in any configuration.
+
+connection.queries is only filled in when DEBUG=True, and then keeps every
+statement for the life of the connection. capture_queries() uses an
+execute_wrapper instead, so the lab's comparisons report real numbers on a
+production-configured server too, and it only sees its own block:
+
+    with capture_queries() as log:
+        list(Order.objects.all()[:200])
+    log.count, log.total_time, log.by_fingerprint()
+
+Memory is bounded: totals are always exact, but only the first
+`max_queries` statements are kept whole, and only `max_fingerprints`
+distinct statements are told apart (the rest are counted as "<other>").
+"""
+import re
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+MAX_QUERIES = 1000
+MAX_FINGERPRINTS = 200
+
+CapturedQuery = namedtuple('CapturedQuery', ['sql', 'params', 'duration', 'fingerprint'])
+
+# by_fingerprint() groups statements by shape: quoted strings and numbers
+# become "?", and an IN list of any length becomes "IN (...)".
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _IN_LISTS.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class QueryLog:
+    """execute_wrapper that records statements, durations and fingerprints."""
+
+    def __init__(self, max_queries=MAX_QUERIES, max_fingerprints=MAX_FINGERPRINTS):
+        self.max_queries = max_queries
+        self.max_fingerprints = max_fingerprints
+        self.queries = []
+        self.count = 0
+        self.total_time = 0.0
+        self.fingerprints = {}  # fingerprint -> [count, total time]
+        self._seen = {}         # sql -> fingerprint
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, params, time.perf_counter() - start)
+
+    def record(self, sql, params, duration):
+        key = self._seen.get(sql)
+        if key is None:
+            key = fingerprint(sql)
+            if key not in self.fingerprints and len(self.fingerprints) >= self.max_fingerprints:
+                key = '<other>'
+            if len(self._seen) < self.max_queries:
+                self._seen[sql] = key
+        self.count += 1
+        self.total_time += duration
+        totals = self.fingerprints.setdefault(key, [0, 0.0])
+        totals[0] += 1
+        totals[1] += duration
+        if len(self.queries) < self.max_queries:
+            self.queries.append(CapturedQuery(sql, params, duration, key))
+
+    @property
+    def dropped(self):
+        """Statements counted in the totals but not kept in `queries`."""
+        return self.count - len(self.queries)
+
+    def by_fingerprint(self):
+        """[(fingerprint, count, total time)], most frequent first."""
+        return sorted(((key, count, seconds) for key, (count, seconds) in self.fingerprints.items()),
+                      key=lambda row: (-row[1], -row[2]))
+
+
+@contextmanager
+def capture_queries(using=DEFAULT_DB_ALIAS, **limits):
+    """
+    with capture_queries() as log: ...
+
+    `log` is the QueryLog of the statements run inside the block.
+    """
+    log = QueryLog(**limits)
+    with connections[using].execute_wrapper(log):
+        yield log
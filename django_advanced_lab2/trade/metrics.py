@@ -0,0 +1,234 @@
+"""
+Request metrics in the Prometheus text format.
+
+MetricsMiddleware (trade/middleware.py) records, per resolved URL name:
+
+- http_requests_total and http_request_duration_seconds;
+- http_request_db_queries and http_request_db_seconds, counted by an
+  execute_wrapper, so they work without DEBUG (connection.queries is only
+  filled in with DEBUG=True);
+- http_response_size_bytes;
+- cache_gets_total by key prefix ("catalog" for "catalog:body:...") and
+  hit/miss, reported by TwoTierCache.
+
+Each process keeps its own numbers. With several worker processes
+(gunicorn), set METRICS_DIR to a directory they share: every process
+writes a snapshot there at most every METRICS_FLUSH_INTERVAL seconds, and
+/metrics adds up all the snapshots. Snapshots of workers that exited stay,
+so counters don't go backwards when a worker is replaced; empty the
+directory when the whole server restarts.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'http_requests_total': (
+        'counter', 'Requests served, by URL name, method and status.', None),
+    'http_request_duration_seconds': (
+        'histogram', 'Time spent in the view and the middleware below MetricsMiddleware.', LATENCY_BUCKETS),
+    'http_request_db_queries': (
+        'histogram', 'SQL statements run per request.', QUERY_BUCKETS),
+    'http_request_db_seconds': (
+        'histogram', 'Time spent executing SQL per request.', LATENCY_BUCKETS),
+    'http_response_size_bytes': (
+        'histogram', 'Size of the response body (streamed responses are not counted).', SIZE_BUCKETS),
+    'cache_gets_total': (
+        'counter', 'Cache reads by URL name, key prefix and result.', None),
+}
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class Registry:
+    """Counters and histograms of one process, keyed by (name, labels)."""
+
+    def __init__(self):
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, series] for (name, labels), series in self.histograms.items()],
+            }
+
+    def merge(self, snapshot):
+        with self.lock:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, series in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                total = self.histograms.setdefault(key, [0] * len(series))
+                for i, value in enumerate(series):
+                    total[i] += value
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+registry = Registry()
+_flushed_at = 0.0
+
+# The request being measured in this thread/task, if any.
+_current = ContextVar('metrics_request', default=None)
+
+
+class RequestMetrics:
+    """What one request did; recorded under its URL name when it ends."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.cache_gets = {}  # (prefix, result) -> count
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(metrics, token, view, method, status, seconds, size):
+    _current.reset(token)
+    labels = {'view': view}
+    registry.inc('http_requests_total', {**labels, 'method': method, 'status': str(status)})
+    registry.observe('http_request_duration_seconds', labels, seconds)
+    registry.observe('http_request_db_queries', labels, metrics.queries)
+    registry.observe('http_request_db_seconds', labels, metrics.db_seconds)
+    if size is not None:
+        registry.observe('http_response_size_bytes', labels, size)
+    for (prefix, result), count in metrics.cache_gets.items():
+        registry.inc('cache_gets_total', {**labels, 'prefix': prefix, 'result': result}, count)
+    flush()
+
+
+def cache_get(key, hit):
+    """Count a cache read of `key`; called by the cache backend."""
+    prefix = str(key).split(':', 1)[0]
+    result = 'hit' if hit else 'miss'
+    metrics = _current.get()
+    if metrics is None:
+        # Outside a request (Celery tasks, management commands)
+        registry.inc('cache_gets_total', {'view': '', 'prefix': prefix, 'result': result})
+    else:
+        metrics.cache_gets[prefix, result] = metrics.cache_gets.get((prefix, result), 0) + 1
+
+
+def _directory():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def flush(force=False):
+    """Write this process's snapshot to METRICS_DIR, at most once per interval."""
+    global _flushed_at
+    directory = _directory()
+    if directory is None:
+        return
+    now = time.monotonic()
+    if not force and now - _flushed_at < getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL):
+        return
+    _flushed_at = now
+    directory.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so a scrape never reads half a file.
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(path, directory / f'{os.getpid()}.json')
+
+
+def collect():
+    """Every process's numbers added up (just this one's without METRICS_DIR)."""
+    directory = _directory()
+    if directory is None:
+        return registry
+    flush(force=True)
+    total = Registry()
+    for path in directory.glob('*.json'):
+        try:
+            total.merge(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            # Gone or replaced while we listed the directory
+            continue
+    return total
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def exposition(source=None):
+    """The metrics in the Prometheus text exposition format (version 0.0.4)."""
+    source = source or collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(source.counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), series in sorted(source.histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(buckets, series):
+                lines.append(f'{name}_bucket{_labels(labels + (("le", _number(float(bound))),))} {count}')
+            lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {series[-1]}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(series[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {series[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,39 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Latency, SQL and response size of every request, by URL name (see
+    trade.metrics). Sits below the profilers so their own queries don't
+    count.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(request_metrics))
+                response = self.get_response(request)
+        except Exception:
+            metrics.end_request(request_metrics, token, self.view_name(request), request.method,
+                                500, time.perf_counter() - start, None)
+            raise
+        size = None if response.streaming else len(response.content)
+        metrics.end_request(request_metrics, token, self.view_name(request), request.method,
+                            response.status_code, time.perf_counter() - start, size)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else '<unresolved>'
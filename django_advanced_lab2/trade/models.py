@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 
 class Customer(models.Model):
     customerID = models.CharField(max_length=20, primary_key=True)
@@ -7,6 +8,7 @@ class Customer(models.Model):
     contactTitle = models.CharField(max_length=200, null=True, blank=True)
     city = models.CharField(max_length=100, null=True, blank=True)
     country = models.CharField(max_length=100, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.companyName
@@ -14,6 +16,7 @@ class Customer(models.Model):
 class Shipper(models.Model):
     shipperID = models.IntegerField(primary_key=True)
     companyName = models.CharField(max_length=200, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.companyName
@@ -22,6 +25,7 @@ class Category(models.Model):
     categoryID = models.IntegerField(primary_key=True)
     categoryName = models.CharField(max_length=200, db_index=True)
     description = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.categoryName
@@ -33,6 +37,14 @@ class Product(models.Model):
     unitPrice = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, db_index=True)
     discontinued = models.BooleanField(default=False)
     categoryID = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='products')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Products still on sale, by category and name
+            models.Index(fields=['categoryID', 'productName'], condition=Q(discontinued=False),
+                         name='trade_product_active_idx'),
+        ]
 
     def __str__(self):
         return self.productName
@@ -44,6 +56,7 @@ class Employee(models.Model):
     city = models.CharField(max_length=100, null=True, blank=True)
     country = models.CharField(max_length=100, null=True, blank=True)
     reportsTo = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='subordinates')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.employeeName
@@ -57,6 +70,14 @@ class Order(models.Model):
     shippedDate = models.DateField(null=True, blank=True)
     shipperID = models.ForeignKey(Shipper, on_delete=models.SET_NULL, null=True, related_name='orders')
     freight = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # A customer's orders by date, and all orders by date
+            models.Index(fields=['customerID', 'orderDate'], name='trade_order_customer_date_idx'),
+            models.Index(fields=['orderDate', 'orderID'], name='trade_order_date_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.orderID}"
@@ -67,9 +88,43 @@ class OrderDetail(models.Model):
     unitPrice = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.IntegerField()
     discount = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = (('orderID','productID'),)
+        indexes = [
+            # a product's order lines; the unique index covers the other way
+            models.Index(fields=['productID', 'orderID'], name='trade_detail_product_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.orderID.orderID} - {self.productID.productName}"
+
+class SalesReport(models.Model):
+    PERIODS = ('day', 'week', 'month', 'quarter', 'year')
+
+    report_id = models.CharField(max_length=100, primary_key=True)
+    period = models.CharField(max_length=10, default='month')
+    status = models.CharField(max_length=20, default='pending')
+    task_id = models.CharField(max_length=255, null=True, blank=True)
+    chunks_total = models.IntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Report {self.report_id} ({self.status})"
+
+class SalesReportChunk(models.Model):
+    report = models.ForeignKey(SalesReport, on_delete=models.CASCADE, related_name='chunks')
+    first_order_id = models.IntegerField()
+    last_order_id = models.IntegerField()
+    data = models.JSONField(null=True, blank=True)
+    done = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = (('report','first_order_id'),)
+
+    def __str__(self):
+        return f"{self.report_id}: orders {self.first_order_id}-{self.last_order_id}"
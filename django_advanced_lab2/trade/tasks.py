@@ -1,14 +1,141 @@
-from celery import shared_task
+from datetime import timedelta
+
+from celery import chord, group, shared_task
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+from django.utils import timezone
 import time
 
+from .models import OrderDetail, Order, SalesReport, SalesReportChunk
+
+REPORT_CHUNK_SIZE = 500
+# A run that has been 'running' this long is taken to have died; starting
+# the report again then resumes it.
+REPORT_STALE_AFTER = timedelta(minutes=30)
+
+TRUNC = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+
+REVENUE = ExpressionWrapper(F('unitPrice') * F('quantity') * (1 - F('discount')), output_field=FloatField())
+
+
+# Sales-by-period report, as a chord: one task per orderID range writes its
+# partial totals to SalesReportChunk, then merge_report adds them up.
+# Finished chunks are skipped when the report is started again, so a report
+# whose worker died resumes where it stopped (once REPORT_STALE_AFTER has
+# passed; until then a second start is a no-op).
+@shared_task(bind=True)
+def generate_report(self, report_id, period='month', chunk_size=REPORT_CHUNK_SIZE, refresh=False):
+    if period not in TRUNC:
+        raise ValueError(f"period must be one of {', '.join(TRUNC)}")
+
+    with transaction.atomic():
+        report, created = (SalesReport.objects.select_for_update()
+                           .get_or_create(report_id=report_id, defaults={'period': period}))
+        if (report.status == 'running' and report.started_at
+                and timezone.now() - report.started_at < REPORT_STALE_AFTER):
+            # Started again while a run is under way (a beat tick, a second
+            # click): a second chord would compute every pending chunk twice.
+            return {'report_id': report_id, 'status': 'running', 'task_id': report.task_id}
+        if refresh or report.period != period:
+            report.chunks.all().delete()
+            report.period = period
+        elif report.status == 'done':
+            return report.result
+        report.status = 'running'
+        report.task_id = self.request.id
+        report.started_at = timezone.now()
+        report.save()
+
+    bounds = Order.objects.aggregate(low=Min('orderID'), high=Max('orderID'))
+    if bounds['low'] is not None:
+        for first in range(bounds['low'], bounds['high'] + 1, chunk_size):
+            SalesReportChunk.objects.get_or_create(
+                report=report, first_order_id=first,
+                defaults={'last_order_id': min(first + chunk_size - 1, bounds['high'])},
+            )
+
+    pending = list(report.chunks.filter(done=False).values_list('pk', flat=True))
+    report.chunks_total = report.chunks.count()
+    report.save(update_fields=['chunks_total'])
+
+    if self.request.is_eager or len(pending) <= 1:
+        # Eager mode (tests, CELERY_TASK_ALWAYS_EAGER) can't wait on a chord
+        # from inside a task, and one chunk isn't worth fanning out.
+        for chunk_id in pending:
+            report_chunk(report_id, chunk_id, progress=not self.request.is_eager)
+        return merge_report(pending, report_id)
+    # The chord takes over this task's id, so the client polls one id and
+    # gets PROGRESS updates from the chunks and the merged report at the end.
+    return self.replace(chord(
+        group(report_chunk.s(report_id, chunk_id) for chunk_id in pending),
+        merge_report.s(report_id),
+    ))
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def report_chunk(self, report_id, chunk_id, progress=True):
+    chunk = SalesReportChunk.objects.select_related('report').get(pk=chunk_id)
+    if not chunk.done:
+        period = TRUNC[chunk.report.period]('orderID__orderDate')
+        rows = (OrderDetail.objects
+                .filter(orderID__gte=chunk.first_order_id, orderID__lte=chunk.last_order_id)
+                .values(period=period)
+                .annotate(revenue=Sum(REVENUE), quantity=Sum('quantity'),
+                          lines=Count('pk'), orders=Count('orderID', distinct=True))
+                .order_by())
+        chunk.data = {
+            (row['period'].isoformat() if row['period'] else 'unknown'): {
+                'revenue': row['revenue'] or 0.0,
+                'quantity': row['quantity'] or 0,
+                'lines': row['lines'],
+                'orders': row['orders'],
+            }
+            for row in rows
+        }
+        chunk.done = True
+        chunk.save(update_fields=['data', 'done'])
+
+    report = chunk.report
+    # An eager run has nobody polling for progress, and maybe no result
+    # backend to publish it to.
+    if progress and report.task_id and not self.request.is_eager and self.app.conf.result_backend:
+        done = report.chunks.filter(done=True).count()
+        self.app.backend.store_result(
+            report.task_id, {'report_id': report_id, 'done': done, 'total': report.chunks_total}, 'PROGRESS'
+        )
+    return chunk_id
+
+
 @shared_task
-def generate_report(report_id):
-    time.sleep(5)
-    return f"Report {report_id} generated."
+def merge_report(chunk_ids, report_id):
+    report = SalesReport.objects.get(report_id=report_id)
+    totals = {}
+    for data in report.chunks.filter(done=True).values_list('data', flat=True):
+        for period, values in (data or {}).items():
+            merged = totals.setdefault(period, {'revenue': 0.0, 'quantity': 0, 'lines': 0, 'orders': 0})
+            for name, value in values.items():
+                merged[name] += value
+
+    report.result = {
+        'report_id': report_id,
+        'period': report.period,
+        'rows': [{'period': period, **values, 'revenue': round(values['revenue'], 2)}
+                 for period, values in sorted(totals.items())],
+    }
+    report.status = 'done'
+    report.finished_at = timezone.now()
+    report.save()
+    return report.result
+
 
 @shared_task
 def process_image(image_path):
     time.sleep(3)
     return f"Image at {image_path} processed."
-
-
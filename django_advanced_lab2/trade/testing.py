@@ -0,0 +1,106 @@
+"""
+Test helpers: a Northwind loader and EXPLAIN for the query budget tests.
+"""
+import csv
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Category, Customer, Employee, Order, OrderDetail, Product, Shipper
+
+# This project ships no data of its own; the tests read the CSV archive of
+# the sibling ms project, which has the same columns.
+ARCHIVE_DIR = settings.BASE_DIR.parent / 'ms' / 'archive'
+
+
+def _read(name, data_dir):
+    with open(data_dir / f'{name}.csv', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def _int(value):
+    return int(value) if value else None
+
+
+def load_northwind(rows=None, data_dir=ARCHIVE_DIR):
+    """
+    Load the archive with bulk_create. With `rows`, load a small but
+    consistent extract instead: the first `rows` orders with all their
+    details, and the first `rows` products plus those the details refer to.
+    """
+    orders = _read('orders', data_dir)
+    details = _read('order_details', data_dir)
+    products = _read('products', data_dir)
+    if rows is not None:
+        orders = orders[:rows]
+        order_ids = {o['orderID'] for o in orders}
+        details = [d for d in details if d['orderID'] in order_ids]
+        product_ids = {d['productID'] for d in details}
+        products = [p for i, p in enumerate(products) if i < rows or p['productID'] in product_ids]
+
+    Category.objects.bulk_create(
+        Category(categoryID=int(r['categoryID']), categoryName=r['categoryName'], description=r['description'])
+        for r in _read('categories', data_dir)
+    )
+    Customer.objects.bulk_create(
+        Customer(customerID=r['customerID'], companyName=r['companyName'], contactName=r['contactName'],
+                 contactTitle=r['contactTitle'], city=r['city'], country=r['country'])
+        for r in _read('customers', data_dir)
+    )
+    Employee.objects.bulk_create(
+        Employee(employeeID=int(r['employeeID']), employeeName=r['employeeName'], title=r['title'],
+                 city=r['city'], country=r['country'], reportsTo_id=_int(r['reportsTo']))
+        for r in _read('employees', data_dir)
+    )
+    Shipper.objects.bulk_create(
+        Shipper(shipperID=int(r['shipperID']), companyName=r['companyName'])
+        for r in _read('shippers', data_dir)
+    )
+    Product.objects.bulk_create(
+        Product(productID=int(r['productID']), productName=r['productName'], quantityPerUnit=r['quantityPerUnit'],
+                unitPrice=Decimal(r['unitPrice']), discontinued=r['discontinued'] == '1',
+                categoryID_id=int(r['categoryID']))
+        for r in products
+    )
+    Order.objects.bulk_create(
+        Order(orderID=int(r['orderID']), customerID_id=r['customerID'], employeeID_id=int(r['employeeID']),
+              orderDate=_date(r['orderDate']), requiredDate=_date(r['requiredDate']),
+              shippedDate=_date(r['shippedDate']), shipperID_id=int(r['shipperID']),
+              freight=Decimal(r['freight'] or '0'))
+        for r in orders
+    )
+    OrderDetail.objects.bulk_create((
+        OrderDetail(orderID_id=int(r['orderID']), productID_id=int(r['productID']),
+                    unitPrice=Decimal(r['unitPrice']), quantity=int(r['quantity']),
+                    discount=float(r['discount'] or 0))
+        for r in details
+    ), batch_size=500)
+
+
+def clear_northwind():
+    for model in (OrderDetail, Order, Product, Shipper, Employee, Customer, Category):
+        model.objects.all().delete()
+
+
+def explain(sql, params=()):
+    """The database's plan for a SELECT, one step per line."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        rows = cursor.fetchall()
+    # SQLite returns (id, parent, notused, detail), PostgreSQL one column
+    return [str(row[-1]) for row in rows]
+
+
+def full_scans(plan):
+    """The steps of a plan that read a whole table."""
+    return [
+        step for step in plan
+        if step.startswith('Seq Scan')
+        or step.startswith('SCAN ') and ' USING ' not in step and step != 'SCAN CONSTANT ROW'
+    ]
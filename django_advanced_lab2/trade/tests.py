@@ -0,0 +1,598 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from northwind_backend.celery import app as celery_app
+
+from .cache_backends import VERSION_KEY, TwoTierCache
+from .catalog import catalog_version
+from .caching import get_or_compute
+from .instrumentation import capture_queries
+from .models import Category, OrderDetail, Product, SalesReport
+from .tasks import REPORT_STALE_AFTER, REVENUE, TRUNC, generate_report
+from .testing import clear_northwind, explain, full_scans, load_northwind
+from . import metrics, urls
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Silk records every request in the database, which would show up in
+# assertNumQueries.
+WITHOUT_PROFILERS = [
+    name for name in settings.MIDDLEWARE if not name.startswith(('silk.', 'debug_toolbar.'))
+]
+
+
+@override_settings(CACHES=LOCMEM)
+class StampedeProtectionTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def compute(self):
+        with self.calls_lock:
+            self.calls += 1
+            value = self.calls
+        time.sleep(0.2)
+        return value
+
+    def hammer(self, threads=20, **options):
+        results = []
+        barrier = threading.Barrier(threads)
+
+        def worker():
+            barrier.wait()
+            results.append(get_or_compute('key', self.compute, **options))
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def test_cold_key_is_computed_once(self):
+        results = self.hammer(timeout=60)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 20)
+
+    def test_expired_key_is_recomputed_once_while_others_get_stale_value(self):
+        get_or_compute('key', self.compute, timeout=60)
+        value, expires, delta = cache.get('key')
+        cache.set('key', (value, time.time() - 1, delta), 60)
+
+        results = self.hammer(timeout=60)
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(sorted(results), [1] * 19 + [2])
+        self.assertEqual(get_or_compute('key', self.compute, timeout=60), 2)
+
+    def test_stuck_lock_is_taken_over_by_one_waiter(self):
+        cache.add('key:lock', 'stuck', 0.3)
+
+        results = self.hammer(timeout=60, lock_timeout=0.3)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 20)
+
+    def test_only_releases_its_own_lock(self):
+        def slow_compute():
+            # Our lock expired and another worker took it over.
+            cache.set('key:lock', 'theirs')
+            return 1
+
+        get_or_compute('key', slow_compute, timeout=60)
+
+        self.assertEqual(cache.get('key:lock'), 'theirs')
+
+    def test_early_refresh_before_expiry(self):
+        get_or_compute('key', self.compute, timeout=60)
+        value, expires, delta = cache.get('key')
+        # 10ms left on a value that took 200ms to compute: a refresh is all
+        # but certain, and it still happens only once.
+        cache.set('key', (value, time.time() + 0.01, delta), 60)
+
+        self.hammer(timeout=60)
+
+        self.assertEqual(self.calls, 2)
+
+
+def two_tier(**options):
+    return override_settings(CACHES={
+        'default': {
+            'BACKEND': 'trade.cache_backends.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'VERSION_CHECK_INTERVAL': 0, **options},
+        },
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    })
+
+
+@two_tier()
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.shared = caches['shared']
+
+    def test_reads_are_served_locally(self):
+        cache.set('products', [1, 2, 3])
+        # gone from the shared tier without a version bump: only the
+        # local copy can answer
+        self.shared.delete('products')
+
+        self.assertEqual(cache.get('products'), [1, 2, 3])
+        self.assertEqual(cache.get_many(['products', 'other']), {'products': [1, 2, 3]})
+
+    def other_process(self):
+        # Different limits, so a local tier of its own.
+        return TwoTierCache('shared', {'OPTIONS': {'VERSION_CHECK_INTERVAL': 0, 'MAX_ENTRIES': 10}})
+
+    def test_writes_from_other_processes_invalidate_their_keys(self):
+        cache.set_many({'products': 'old', 'orders': 'kept'})
+        self.shared.delete('orders')
+        self.other_process().set('products', 'new')
+
+        self.assertEqual(cache.get('products'), 'new')
+        # only served by our local tier, which the write left alone
+        self.assertEqual(cache.get('orders'), 'kept')
+
+    def test_lost_changes_drop_the_local_tier(self):
+        cache.set('products', 'old')
+        self.shared.set('products', 'new')
+        self.shared.incr(VERSION_KEY)  # a change nobody recorded
+
+        self.assertEqual(cache.get('products'), 'new')
+
+    def test_locks_are_not_logged(self):
+        cache.set('products', 1)
+        version = self.shared.get(VERSION_KEY)
+        cache.add('products:lock', True)
+        cache.delete('products:lock')
+
+        self.assertEqual(self.shared.get(VERSION_KEY), version)
+
+    def test_touch_updates_the_local_copy(self):
+        cache.set('products', 'old')
+        cache.touch('products', 0)
+        self.shared.set('products', 'new')
+
+        self.assertEqual(cache.get('products'), 'new')
+
+    def test_local_copies_expire(self):
+        with two_tier(LOCAL_TIMEOUT=0.05):
+            cache.set('products', 'old')
+            self.shared.set('products', 'new')
+            time.sleep(0.1)
+
+            self.assertEqual(cache.get('products'), 'new')
+
+    def test_local_tier_is_bounded_by_size(self):
+        with two_tier(MAX_BYTES=3000):
+            for key in 'abc':
+                cache.set(key, 'x' * 1000)
+            self.shared.delete_many(['a', 'b', 'c'])
+
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('c'))
+
+    def test_add_and_delete(self):
+        self.assertTrue(cache.add('lock', 1))
+        self.assertFalse(cache.add('lock', 2))
+        cache.delete('lock')
+
+        self.assertIsNone(cache.get('lock'))
+        self.assertTrue(cache.add('lock', 3))
+
+
+@override_settings(CACHES=LOCMEM, MIDDLEWARE=WITHOUT_PROFILERS)
+class CatalogTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(productID=1, productName='Chai', unitPrice=Decimal('18.00'))
+        Product.objects.create(productID=2, productName='Chang', unitPrice=Decimal('19.00'))
+        self.url = reverse('cached_products')
+
+    def test_lists_products(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.json(), {'count': 2, 'products': [
+            {'productID': 1, 'productName': 'Chai', 'unitPrice': '18.00'},
+            {'productID': 2, 'productName': 'Chang', 'unitPrice': '19.00'},
+        ]})
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertNotIn('Last-Modified', response)
+
+    def test_cache_hit_runs_no_queries(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+
+    def test_matching_etag_is_304(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_product_write_changes_version(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=2).delete()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_version_changes_only_after_commit(self):
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                Product.objects.filter(pk=1).update(productName='Chai tea')
+                Product.objects.get(pk=2).save()
+            # Until the commit, other requests still read the old rows.
+            self.assertEqual(catalog_version(), version)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(catalog_version(), version)
+        self.assertIn('Chai tea', self.client.get(self.url).json()['products'][0]['productName'])
+
+
+@override_settings(CACHES=LOCMEM, MIDDLEWARE=WITHOUT_PROFILERS)
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(categoryID=1, categoryName='Beverages')
+        Product.objects.create(productID=1, productName='Chai', unitPrice=Decimal('18.00'), categoryID=self.category)
+        self.url = reverse('product-list')
+
+    def test_matching_etag_is_304_after_one_query(self):
+        response = self.client.get(self.url)
+        self.assertIn('public', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_related_write_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.category.categoryName = 'Drinks'
+        self.category.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['categoryID'], 'Drinks')
+
+    def test_retrieve(self):
+        url = reverse('product-detail', args=[1])
+        etag = self.client.get(url)['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('product-detail', args=[2])).status_code, 404)
+
+
+# (url name, url args, query string, query budget, indexed)
+# The budget must hold on the full archive and the count must be the same
+# on a 10-order extract: a query per row shows up as a difference. On
+# `indexed` endpoints no SELECT may scan a whole table.
+ENDPOINT_BUDGETS = [
+    ('api-root', [], {}, 0, False),
+    # ETag aggregate, COUNT(*), page
+    ('product-list', [], {}, 3, False),
+    ('product-detail', [1], {}, 2, True),
+    ('product-demo', [], {}, 9, False),
+    ('order-list', [], {}, 3, False),
+    ('order-detail', [10248], {}, 2, True),
+    ('order-optimized', [], {}, 1, False),
+    ('order-prefetch', [], {}, 2, False),
+    ('order-profile-demo', [], {}, 3, False),
+    ('heavy_computation', [], {}, 0, False),
+    ('dashboard', [], {}, 0, False),
+    ('cached_products', [], {}, 1, False),
+    # the view only queues the task
+    ('task_handler', ['report'], {}, 0, False),
+    ('task_handler', ['process-image'], {}, 0, False),
+    ('report_status', ['monthly'], {}, 2, True),
+]
+# Deliberately slow demo endpoints: the suite must flag them.
+KNOWN_N_PLUS_ONE = [
+    ('product-nplus1', [], {}),
+]
+
+
+@override_settings(CACHES=LOCMEM, MIDDLEWARE=WITHOUT_PROFILERS)
+class EndpointQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Queue tasks in memory instead of on Redis; nothing consumes them.
+        # The app reads the CELERY_ namespace, so those are the keys to set.
+        previous = {'CELERY_BROKER_URL': celery_app.conf.broker_url,
+                    'CELERY_RESULT_BACKEND': celery_app.conf.result_backend}
+        celery_app.conf.update(CELERY_BROKER_URL='memory://', CELERY_RESULT_BACKEND='cache+memory://')
+        cls.addClassCleanup(celery_app.conf.update, previous)
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+        SalesReport.objects.create(report_id='monthly', status='done', result={'rows': []})
+
+    def queries(self, name, args, query):
+        """The statements one request runs, with the cache cold."""
+        cache.clear()
+        # heavy/ sleeps for 3s on a cold key, and runs no SQL either way
+        get_or_compute('heavy_data', lambda: {"message": "Calculated data", "value": 42}, timeout=60)
+        with capture_queries() as log:
+            response = self.client.get(reverse(name, args=args), query)
+        self.assertLess(response.status_code, 400, name)
+        return log.queries
+
+    def measure_all(self, endpoints):
+        return [len(self.queries(*endpoint[:3])) for endpoint in endpoints]
+
+    def shrink_to_extract(self):
+        clear_northwind()
+        load_northwind(rows=10)
+
+    def test_every_endpoint_has_a_budget(self):
+        names = {pattern.name for pattern in urls.router.urls} | {
+            pattern.name for pattern in urls.urlpatterns if hasattr(pattern, 'name')
+        }
+        names -= {None, '__debug__'}
+        covered = {endpoint[0] for endpoint in ENDPOINT_BUDGETS + KNOWN_N_PLUS_ONE}
+        self.assertEqual(names - covered, set())
+
+    def test_query_counts_are_within_budget_and_flat(self):
+        full = self.measure_all(ENDPOINT_BUDGETS)
+        self.shrink_to_extract()
+        small = self.measure_all(ENDPOINT_BUDGETS)
+
+        for endpoint, at_full, at_small in zip(ENDPOINT_BUDGETS, full, small):
+            name, args, _, budget, _ = endpoint
+            with self.subTest(endpoint=name, args=args):
+                self.assertLessEqual(at_full, budget)
+                self.assertEqual(at_full, at_small, "query count grows with the number of rows")
+
+    def test_known_n_plus_one_is_caught(self):
+        full = self.measure_all(KNOWN_N_PLUS_ONE)
+        self.shrink_to_extract()
+        small = self.measure_all(KNOWN_N_PLUS_ONE)
+
+        for endpoint, at_full, at_small in zip(KNOWN_N_PLUS_ONE, full, small):
+            with self.subTest(endpoint=endpoint[0]):
+                self.assertGreater(at_full, at_small)
+
+    def test_indexed_endpoints_do_not_scan_tables(self):
+        for name, args, query, _, indexed in ENDPOINT_BUDGETS:
+            if not indexed:
+                continue
+            for captured in self.queries(name, args, query):
+                if not captured.sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                with self.subTest(endpoint=name, sql=captured.sql[:80]):
+                    self.assertEqual(full_scans(explain(captured.sql, captured.params)), [])
+
+
+@two_tier()
+@override_settings(MIDDLEWARE=WITHOUT_PROFILERS, METRICS_DIR=None)
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+        category = Category.objects.create(categoryID=1, categoryName='Beverages')
+        Product.objects.create(productID=1, productName='Chai', unitPrice=Decimal('18.00'), categoryID=category)
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode().splitlines()
+
+    def test_request_latency_queries_and_size_by_url_name(self):
+        size = len(self.client.get(reverse('product-list')).content)
+
+        lines = self.scrape()
+        self.assertIn('http_requests_total{method="GET",status="200",view="product-list"} 1', lines)
+        self.assertIn('http_request_duration_seconds_count{view="product-list"} 1', lines)
+        self.assertIn('http_request_duration_seconds_bucket{view="product-list",le="+Inf"} 1', lines)
+        # ETag aggregate, COUNT(*), page; recorded without DEBUG
+        self.assertIn('http_request_db_queries_sum{view="product-list"} 3.0', lines)
+        self.assertIn('http_request_db_queries_bucket{view="product-list",le="2.0"} 0', lines)
+        self.assertIn('http_request_db_queries_bucket{view="product-list",le="5.0"} 1', lines)
+        self.assertIn(f'http_response_size_bytes_sum{{view="product-list"}} {float(size)}', lines)
+        self.assertIn('# TYPE http_request_db_seconds histogram', lines)
+
+    def cache_gets(self):
+        prefix = 'cache_gets_total{prefix="catalog",result='
+        return {
+            line[len(prefix):].split('"')[1]: int(line.rsplit(' ', 1)[1])
+            for line in self.scrape() if line.startswith(prefix)
+        }
+
+    def test_cache_hits_and_misses_by_prefix(self):
+        self.client.get(reverse('cached_products'))
+        cold = self.cache_gets()
+        self.client.get(reverse('cached_products'))
+        warm = self.cache_gets()
+
+        self.assertGreater(cold['miss'], 0)
+        # the second request finds the version and the body
+        self.assertEqual(warm['miss'], cold['miss'])
+        self.assertGreaterEqual(warm['hit'] - cold.get('hit', 0), 2)
+
+    def test_unresolved_urls_share_one_label(self):
+        self.client.get('/no-such-page/')
+
+        self.assertIn('http_requests_total{method="GET",status="404",view="<unresolved>"} 1', self.scrape())
+
+    def test_processes_add_up_through_shared_directory(self):
+        other = metrics.Registry()
+        other.inc('http_requests_total', {'view': 'product-list', 'method': 'GET', 'status': '200'}, 4)
+        other.observe('http_request_db_queries', {'view': 'product-list'}, 7)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            with open(os.path.join(directory, '1.json'), 'w') as f:
+                json.dump(other.snapshot(), f)
+            self.client.get(reverse('product-list'))
+
+            lines = self.scrape()
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+
+        self.assertIn('http_requests_total{method="GET",status="200",view="product-list"} 5', lines)
+        self.assertIn('http_request_db_queries_count{view="product-list"} 2', lines)
+        self.assertIn('http_request_db_queries_sum{view="product-list"} 10.0', lines)
+
+
+@override_settings(CACHES=LOCMEM, MIDDLEWARE=WITHOUT_PROFILERS, DEBUG=False)
+class QueryCaptureTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(categoryID=1, categoryName='Beverages')
+        for pk, name in enumerate(['Chai', 'Chang', 'Aniseed Syrup'], start=1):
+            Product.objects.create(productID=pk, productName=name, unitPrice=Decimal('10.00'), categoryID=category)
+
+    def test_groups_statements_by_fingerprint(self):
+        with capture_queries() as log:
+            for pk in (1, 2, 3):
+                Product.objects.get(pk=pk)
+            Category.objects.count()
+
+        self.assertEqual(log.count, 4)
+        self.assertGreater(log.total_time, 0)
+        (top, count, _), (_, other, _) = log.by_fingerprint()
+        self.assertEqual((count, other), (3, 1))
+        self.assertIn('FROM "trade_product"', top)
+        self.assertEqual([q.params for q in log.queries[:3]], [(1,), (2,), (3,)])
+
+    def test_in_lists_of_any_length_share_a_fingerprint(self):
+        with capture_queries() as log:
+            list(Product.objects.filter(pk__in=[1, 2]))
+            list(Product.objects.filter(pk__in=[1, 2, 3]))
+
+        [(key, count, _)] = log.by_fingerprint()
+        self.assertEqual(count, 2)
+        self.assertIn('IN (...)', key)
+
+    def test_memory_is_bounded(self):
+        with capture_queries(max_queries=2, max_fingerprints=1) as log:
+            for pk in (1, 2, 3):
+                Product.objects.get(pk=pk)
+            Category.objects.count()
+
+        self.assertEqual((log.count, len(log.queries), log.dropped), (4, 2, 2))
+        self.assertEqual([(key, count) for key, count, _ in log.by_fingerprint()][1], ('<other>', 1))
+
+    def test_demo_actions_count_queries_without_debug(self):
+        data = self.client.get(reverse('product-nplus1')).json()
+
+        # the products, then one category lookup per product
+        self.assertEqual(data['query_count'], 4)
+        self.assertEqual(data['statements'][0]['count'], 3)
+        self.assertEqual(self.client.get(reverse('order-optimized')).json()['query_count'], 1)
+
+
+# The result backend stays the project's Redis one: an eager run must not
+# need it.
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+class SalesReportTaskTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def aggregate(self, **filters):
+        """The report's rows computed in one query, keyed by period."""
+        rows = (OrderDetail.objects.filter(**filters)
+                .values(period=TRUNC['month']('orderID__orderDate'))
+                .annotate(revenue=Sum(REVENUE), quantity=Sum('quantity'),
+                          lines=Count('pk'), orders=Count('orderID', distinct=True))
+                .order_by('period'))
+        return {row['period'].isoformat(): row for row in rows}
+
+    def assertMatchesAggregate(self, rows, expected):
+        self.assertEqual([row['period'] for row in rows], list(expected))
+        for row in rows:
+            with self.subTest(period=row['period']):
+                # merged revenue is rounded to cents
+                self.assertAlmostEqual(row['revenue'], expected[row['period']]['revenue'], delta=0.01)
+                for name in ('quantity', 'lines', 'orders'):
+                    self.assertEqual(row[name], expected[row['period']][name])
+
+    def run_report(self, **options):
+        return generate_report.delay('monthly', chunk_size=200, **options).get()
+
+    def test_chunks_hold_their_order_range(self):
+        self.run_report()
+
+        report = SalesReport.objects.get(report_id='monthly')
+        chunks = list(report.chunks.order_by('first_order_id'))
+        self.assertEqual(report.chunks_total, 5)
+        self.assertEqual([(c.first_order_id, c.last_order_id) for c in chunks][:2], [(10248, 10447), (10448, 10647)])
+        self.assertTrue(all(chunk.done for chunk in chunks))
+        expected = self.aggregate(orderID__gte=10448, orderID__lte=10647)
+        self.assertMatchesAggregate([{'period': period, **values} for period, values in chunks[1].data.items()],
+                                    expected)
+
+    def test_merged_totals_match_a_direct_aggregate(self):
+        result = self.run_report()
+
+        self.assertEqual(result['period'], 'month')
+        self.assertMatchesAggregate(result['rows'], self.aggregate())
+        self.assertEqual(SalesReport.objects.get(report_id='monthly').status, 'done')
+
+    def test_resumes_after_finished_chunks(self):
+        self.run_report()
+        report = SalesReport.objects.get(report_id='monthly')
+        first, *rest = report.chunks.order_by('first_order_id')
+        # A run that died after its first chunk: that one is kept as it is.
+        first.data = {'1999-01-01': {'revenue': 1.0, 'quantity': 1, 'lines': 1, 'orders': 1}}
+        first.save()
+        report.chunks.filter(pk__in=[chunk.pk for chunk in rest]).update(done=False, data=None)
+        SalesReport.objects.filter(pk='monthly').update(
+            status='running', started_at=timezone.now() - REPORT_STALE_AFTER - timedelta(minutes=1),
+        )
+
+        result = self.run_report()
+
+        self.assertEqual(result['rows'][0]['period'], '1999-01-01')
+        self.assertMatchesAggregate(result['rows'][1:], self.aggregate(orderID__gt=first.last_order_id))
+
+    def test_does_not_start_twice(self):
+        SalesReport.objects.create(report_id='monthly', status='running', task_id='first',
+                                   started_at=timezone.now())
+
+        for refresh in (False, True):
+            self.assertEqual(self.run_report(refresh=refresh),
+                             {'report_id': 'monthly', 'status': 'running', 'task_id': 'first'})
+        report = SalesReport.objects.get(report_id='monthly')
+        self.assertEqual((report.task_id, report.chunks.count()), ('first', 0))
+
+    def test_refresh_recomputes_a_finished_report(self):
+        first = self.run_report()
+        SalesReport.objects.get(report_id='monthly').chunks.update(
+            data={'1999-01-01': {'revenue': 1.0, 'quantity': 1, 'lines': 1, 'orders': 1}}
+        )
+
+        self.assertEqual(self.run_report(), first)
+        self.assertMatchesAggregate(self.run_report(refresh=True)['rows'], self.aggregate())
@@ -12,10 +12,10 @@ router.register(r'products', ProductViewSet, basename='product')
 urlpatterns = [
     path('', include(router.urls)),
     path("heavy/", views.heavy_computation_view, name="heavy_computation"),
-    path("stats/", views.query_stats, name="query_stats"),
     path("dashboard/", views.dashboard, name="dashboard"),
-    path("products/", views.cached_products, name="cached_products"),
+    path("catalog/", views.cached_products, name="cached_products"),
     path('tasks/<str:task_name>/', TaskView.as_view(), name='task_handler'),
+    path('reports/<str:report_id>/', views.report_status, name='report_status'),
 ]
 
 if settings.DEBUG:
@@ -2,12 +2,11 @@ from django.views import View
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db import connection
+from django.db import transaction
 from django.db.models import Q, F
 from .models import Order, Product
 from .serializers import OrderSerializer, ProductSerializer
-from django.core.cache import cache
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from trade.models import Product
 from django.shortcuts import render
 from datetime import datetime
@@ -19,24 +18,38 @@ import random
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from .tasks import generate_report, process_image
+from .caching import get_or_compute
+from .catalog import bump_catalog_version, catalog_body, catalog_version
+from .conditional import ConditionalGetMixin
+from .instrumentation import capture_queries
+from .metrics import exposition
+from django.db.models.functions import Now
+from django.views.decorators.http import condition
+from .models import SalesReport
+import csv
 
 # Low-level Caching API
+# get_or_compute() lets one request recompute an expired key while the
+# others keep getting the previous value, instead of all of them sleeping.
 def heavy_computation_view(request):
-    key = "heavy_data"
-    data = cache.get(key)
-    if data is None:
+    def compute():
         time.sleep(3)
-        data = {"message": "Calculated data", "value": 42}
-        cache.set(key, data, timeout=60)
+        return {"message": "Calculated data", "value": 42}
+
+    data = get_or_compute("heavy_data", compute, timeout=60)
     return JsonResponse(data)
 
-#Per-View Caching
-def query_stats(prefix):
-    total = sum(float(q.get("time") or 0) for q in connection.queries)
+# SQL counters for the demo actions below. They come from capture_queries(),
+# so they are right with DEBUG=False, when connection.queries stays empty.
+def query_stats(prefix, log):
     return {
         "prefix": prefix,
-        "query_count": len(connection.queries),
-        "total_sql_time": total
+        "query_count": log.count,
+        "total_sql_time": log.total_time,
+        "statements": [
+            {"sql": sql, "count": count, "time": seconds}
+            for sql, count, seconds in log.by_fingerprint()[:5]
+        ],
     }
 
 #Template Fragment Caching
@@ -47,13 +60,19 @@ def dashboard(request):
 
 
 #Database Query Caching (Manual Pattern)
+# The catalog is cached as the final JSON bytes, so a hit skips the query
+# and the serialization; a Product write moves the catalog version, which
+# is also the ETag, so clients revalidate with a bodiless 304. There is
+# no Last-Modified: with its one-second resolution, a write in the same
+# second as a client's copy would still get a 304.
+def _catalog_etag(request):
+    return '"%s"' % catalog_version()
+
+
+@condition(etag_func=_catalog_etag)
 def cached_products(request):
-    key = "all_products"
-    products = cache.get(key)
-    if products is None:
-        products = list(Product.objects.values("id", "name", "price"))
-        cache.set(key, products, 300)
-    return JsonResponse({"count": len(products), "products": products})
+    body = catalog_body(catalog_version())
+    return HttpResponse(body, content_type="application/json")
 
 
 
@@ -63,7 +82,11 @@ class TaskView(View):
     def get(self, request, task_name):
         if task_name == 'report':
             report_id = request.GET.get('report_id', 'default_report')
-            task = generate_report.delay(report_id)
+            period = request.GET.get('period', 'month')
+            if period not in SalesReport.PERIODS:
+                return JsonResponse({"error": f"period must be one of {', '.join(SalesReport.PERIODS)}"}, status=400)
+            refresh = request.GET.get('refresh') in ('1', 'true')
+            task = generate_report.delay(report_id, period=period, refresh=refresh)
             return JsonResponse({"task_id": task.id, "message": f"Report generation started for {report_id}"})
 
         elif task_name == 'process-image':
@@ -76,6 +99,40 @@ class TaskView(View):
 
 
 
+#Prometheus metrics (see trade/metrics.py)
+def metrics_view(request):
+    return HttpResponse(exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+#Sales report status / export
+def report_status(request, report_id):
+    try:
+        report = SalesReport.objects.get(report_id=report_id)
+    except SalesReport.DoesNotExist:
+        return JsonResponse({"error": "Report not found"}, status=404)
+
+    if request.GET.get('format') == 'csv':
+        if report.status != 'done':
+            return JsonResponse({"error": "Report is not finished yet"}, status=409)
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="sales-{report.report_id}.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['period', 'revenue', 'quantity', 'lines', 'orders'])
+        for row in report.result['rows']:
+            writer.writerow([row['period'], row['revenue'], row['quantity'], row['lines'], row['orders']])
+        return response
+
+    return JsonResponse({
+        "report_id": report.report_id,
+        "period": report.period,
+        "status": report.status,
+        "task_id": report.task_id,
+        "chunks_done": report.chunks.filter(done=True).count(),
+        "chunks_total": report.chunks_total,
+        "result": report.result,
+    })
+
+
 def profile_callable(func, *args, **kwargs):
     pr = cProfile.Profile()
     pr.enable()
@@ -87,16 +144,25 @@ def profile_callable(func, *args, **kwargs):
     return result, s.getvalue()
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Product.objects.all()
+# list/retrieve answer 304 when the client's ETag is still current
+class ProductViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    # the serializer prints the category name
+    queryset = Product.objects.select_related('categoryID')
     serializer_class = ProductSerializer
+    validator_fields = ('updated_at', 'categoryID__updated_at')
 
     # ---------- N+1 problem ----------(51 Queries)
     @action(detail=False, url_path='nplus1')
     def nplus1(self, request):
-        connection.queries.clear()
-        products = list(Product.objects.all()[:50])
-        return Response(ProductSerializer(products, many=True).data)
+        start = time.perf_counter()
+        with capture_queries() as log:
+            products = list(Product.objects.all()[:50])
+            data = ProductSerializer(products, many=True).data
+        return Response({
+            "duration": time.perf_counter() - start,
+            **query_stats("N+1", log),
+            "results": data
+        })
 
     # ---------- Lab 2 ----------
     @action(detail=False, url_path='demo')
@@ -104,46 +170,50 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         response_data = {}
 
         # ---------- Q() filter ----------
-        connection.queries.clear()
         start = time.perf_counter()
-        qres = Product.objects.filter(Q(productName__icontains='ch') | Q(unitPrice__lt=20))[:50]
+        with capture_queries() as log:
+            qres = Product.objects.filter(Q(productName__icontains='ch') | Q(unitPrice__lt=20))[:50]
+            rows = qres.count()
         duration = time.perf_counter() - start
         response_data["Q_filter"] = {
             "duration": duration,
-            "rows": qres.count(),
-            **query_stats("Q() filter")
+            "rows": rows,
+            **query_stats("Q() filter", log)
         }
 
         # ---------- F() update ----------
         start = time.perf_counter()
-        ids = list(Product.objects.values_list('pk', flat=True)[:5])
-        Product.objects.filter(pk__in=ids).update(unitPrice=F('unitPrice') + 1)
+        with capture_queries() as log:
+            ids = list(Product.objects.values_list('pk', flat=True)[:5])
+            # update() skips auto_now and post_save, so do their work here
+            Product.objects.filter(pk__in=ids).update(unitPrice=F('unitPrice') + 1, updated_at=Now())
+            transaction.on_commit(bump_catalog_version)
         duration = time.perf_counter() - start
         response_data["F_update"] = {
             "duration": duration,
-            **query_stats("F() update")
+            **query_stats("F() update", log)
         }
 
         # ---------- only() ----------
-        connection.queries.clear()
         start = time.perf_counter()
-        for p in Product.objects.all().only('productName')[:100]:
-            _ = p.productName
+        with capture_queries() as log:
+            for p in Product.objects.all().only('productName')[:100]:
+                _ = p.productName
         duration = time.perf_counter() - start
         response_data["only_iteration"] = {
             "duration": duration,
-            "queries": len(connection.queries)
+            "queries": log.count
         }
 
         # ---------- defer() ----------
-        connection.queries.clear()
         start = time.perf_counter()
-        for p in Product.objects.all().defer('unitPrice')[:100]:
-            _ = p.productName
+        with capture_queries() as log:
+            for p in Product.objects.all().defer('unitPrice')[:100]:
+                _ = p.productName
         duration = time.perf_counter() - start
         response_data["defer_iteration"] = {
             "duration": duration,
-            "queries": len(connection.queries)
+            "queries": log.count
         }
 
         # ---------- values() ----------
@@ -167,34 +237,36 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         # ---------- Index performance ----------
         index_perf = {}
         for field in ['productName', 'unitPrice']:
-            connection.queries.clear()
             start = time.perf_counter()
-            _ = list(Product.objects.filter(**{f"{field}__icontains": 'a'})[:100])
+            with capture_queries() as log:
+                _ = list(Product.objects.filter(**{f"{field}__icontains": 'a'})[:100])
             duration = time.perf_counter() - start
             index_perf[field] = {
                 "duration": duration,
-                "queries": len(connection.queries)
+                "queries": log.count
             }
         response_data["index_perf"] = index_perf
 
         return Response(response_data)
 
 
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Order.objects.all()
+class OrderViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    # the serializer prints the customer, employee and shipper names
+    queryset = Order.objects.select_related('customerID', 'employeeID', 'shipperID')
     serializer_class = OrderSerializer
+    validator_fields = ('updated_at', 'customerID__updated_at', 'employeeID__updated_at', 'shipperID__updated_at')
 
     # ---------- select_related  ----------(1 Query)
     @action(detail=False, url_path='optimized')
     def optimized(self, request):
-        connection.queries.clear()
         start = time.perf_counter()
 
-        qs = Order.objects.select_related("customerID", "employeeID", "shipperID").all()[:200]
-        data = OrderSerializer(qs, many=True).data
+        with capture_queries() as log:
+            qs = Order.objects.select_related("customerID", "employeeID", "shipperID").all()[:200]
+            data = OrderSerializer(qs, many=True).data
 
         duration = time.perf_counter() - start
-        stats = query_stats("select_related")
+        stats = query_stats("select_related", log)
 
         return Response({
             "duration": duration,
@@ -205,16 +277,16 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     # ---------- select_related + prefetch_related  ----------(2 Queries)
     @action(detail=False, url_path='prefetch')
     def prefetch(self, request):
-        connection.queries.clear()
         start = time.perf_counter()
 
-        qs = Order.objects.select_related("customerID", "employeeID", "shipperID") \
-                          .prefetch_related("details")[:200]
+        with capture_queries() as log:
+            qs = Order.objects.select_related("customerID", "employeeID", "shipperID") \
+                              .prefetch_related("details")[:200]
 
-        data = OrderSerializer(qs, many=True).data
+            data = OrderSerializer(qs, many=True).data
 
         duration = time.perf_counter() - start
-        stats = query_stats("select_related + prefetch_related")
+        stats = query_stats("select_related + prefetch_related", log)
 
         return Response({
             "duration": duration,
@@ -226,7 +298,7 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, url_path='profile-demo')
     def profile_demo(self, request):
         def demo_function():
-            qs = Order.objects.select_related('customerID', 'employeeID').prefetch_related('details')[:500]
+            qs = Order.objects.select_related('customerID', 'employeeID').prefetch_related('details__productID')[:500]
             out = []
             for o in qs:
                 out.append({
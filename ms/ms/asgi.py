@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ms.settings')
 
 application = get_asgi_application()
+
+# Warm the in-memory autocomplete index while the first requests come in.
+from trader import autocomplete  # noqa: E402
+
+autocomplete.start_loading()
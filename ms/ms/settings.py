@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,12 +54,24 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
-    'trader.middleware.cProfileMiddleware',
+    'trader.middleware.SamplingProfilerMiddleware',
+    'trader.middleware.NPlusOneMiddleware',
 ]
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
 SILKY_PYTHON_PROFILER = False
+# N+1 detector: share of requests watched, and how often one statement may
+# run in a request before it is logged
+NPLUSONE_SAMPLE_RATE = 0.05
+NPLUSONE_THRESHOLD = 10
+# Stack-sampling profiler: share of requests profiled, seconds between samples
+PROFILER_SAMPLE_RATE = 0.1
+PROFILER_INTERVAL = 0.01
+# With several worker processes, point PROFILER_DIR at a directory they
+# share so /admin/profile/ adds up all of them.
+PROFILER_DIR = os.environ.get('PROFILER_DIR')
+PROFILER_FLUSH_INTERVAL = 5.0
 ROOT_URLCONF = 'ms.urls'
 
 TEMPLATES = [
@@ -90,6 +103,22 @@ DATABASES = {
     }
 }
 
+# Response caching and the autocomplete index (trader/caching.py) keep
+# generation counters in the default cache; every server process and
+# management command must see the same ones. Point CACHE_DIR at a directory
+# they share, or replace this with Redis/Memcached. Tests use a LocMemCache
+# (trader.testing.TestRunner).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+TEST_RUNNER = 'trader.testing.TestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -4,7 +4,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings  # Import settings
 
+from trader.views import sampled_profile
+
 urlpatterns = [
+    # Flamegraph of the sampled requests, for staff only
+    path('admin/profile/', admin.site.admin_view(sampled_profile), name='sampled-profile'),
     path('admin/', admin.site.urls),
     
     # Your app's API URLs
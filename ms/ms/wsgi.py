@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ms.settings')
 
 application = get_wsgi_application()
+
+# Warm the in-memory autocomplete index while the first requests come in.
+from trader import autocomplete  # noqa: E402
+
+autocomplete.start_loading()
@@ -0,0 +1,331 @@
+"""
+In-memory type-ahead index for product, category and customer names.
+
+Autocomplete fires on every keystroke, so even the full-text index in
+trader.search is one database round-trip too many. Each process instead
+keeps the names in memory:
+
+- two sorted lists per kind, of the normalized names and of every word
+  suffix of them ("boston crab meat", "crab meat", "meat"), so a prefix
+  is a bisect plus a short forward scan;
+- a trigram -> entries map, for terms of three or more characters that
+  only occur inside a word ("hai" in "Chai").
+
+Names starting with the term come first, in alphabetical order, then
+names with a later word starting with it (ordered from that word on),
+then the rest.
+
+The index is loaded in a background thread when the server starts
+(ms/wsgi.py, ms/asgi.py) and kept current in two ways. post_save and
+post_delete (see trader.signals) apply a process's own writes as soon as
+they commit. Writes from other processes and bulk writes (the importer,
+truncate_tables) move the generation counters in trader.caching instead;
+they are compared at most every CHECK_INTERVAL seconds and a difference
+reloads the index in the background, while the old one keeps answering.
+That only works as long as the counters live in a cache all processes
+share (CACHES in ms/settings.py); with a per-process LocMemCache other
+processes' writes would never show up.
+Until the first load has finished, suggest() queries the database.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+
+from .caching import get_generations
+from .models import Category, Customer, Product
+
+logger = logging.getLogger(__name__)
+
+# kind -> (model, name field)
+KINDS = {
+    'product': (Product, 'productName'),
+    'category': (Category, 'categoryName'),
+    'customer': (Customer, 'companyName'),
+}
+MODELS = [model for model, _ in KINDS.values()]
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Seconds between two reads of the generation counters.
+CHECK_INTERVAL = 1.0
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _NameIndex:
+    """The names of one kind: pk -> name, plus the sorted lists and trigrams."""
+
+    def __init__(self, rows=()):
+        self.names = {}
+        self.texts = {}     # pk -> normalized name
+        self.starts = []    # (normalized name, pk)
+        self.suffixes = []  # (normalized name from its 2nd, 3rd... word on, pk)
+        self.trigrams = defaultdict(set)
+        for pk, name in rows:
+            self._add(pk, name, sort=False)
+        self.starts.sort()
+        self.suffixes.sort()
+
+    @staticmethod
+    def _keys(pk, name):
+        text = normalize(name)
+        words = text.split(' ')
+        suffixes = [(' '.join(words[i:]), pk) for i in range(1, len(words))]
+        return text, (text, pk), suffixes
+
+    def _add(self, pk, name, sort=True):
+        text, start, suffixes = self._keys(pk, name)
+        self.names[pk] = name
+        self.texts[pk] = text
+        if sort:
+            bisect.insort(self.starts, start)
+            for suffix in suffixes:
+                bisect.insort(self.suffixes, suffix)
+        else:
+            self.starts.append(start)
+            self.suffixes.extend(suffixes)
+        for gram in _trigrams(text):
+            self.trigrams[gram].add(pk)
+
+    def discard(self, pk):
+        name = self.names.pop(pk, None)
+        if name is None:
+            return
+        del self.texts[pk]
+        text, start, suffixes = self._keys(pk, name)
+        for keys, key in [(self.starts, start)] + [(self.suffixes, s) for s in suffixes]:
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+        for gram in _trigrams(text):
+            pks = self.trigrams[gram]
+            pks.discard(pk)
+            if not pks:
+                del self.trigrams[gram]
+
+    def put(self, pk, name):
+        if self.names.get(pk) == name:
+            return
+        self.discard(pk)
+        self._add(pk, name)
+
+    @staticmethod
+    def _prefixed(keys, term):
+        for i in range(bisect.bisect_left(keys, (term,)), len(keys)):
+            if not keys[i][0].startswith(term):
+                return
+            yield keys[i]
+
+    def name_prefix(self, term):
+        return self._prefixed(self.starts, term)
+
+    def word_prefix(self, term):
+        return self._prefixed(self.suffixes, term)
+
+    def infix(self, term, limit):
+        postings = sorted((self.trigrams.get(gram, ()) for gram in _trigrams(term)), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return heapq.nsmallest(limit, ((self.texts[pk], pk) for pk in candidates if term in self.texts[pk]))
+
+
+class AutocompleteIndex:
+    """Prefix and trigram index over the names of every kind in KINDS."""
+
+    def __init__(self, rows_by_kind=None):
+        rows_by_kind = rows_by_kind or {}
+        self.kinds = {kind: _NameIndex(rows_by_kind.get(kind, ())) for kind in KINDS}
+
+    def __len__(self):
+        return sum(len(names.names) for names in self.kinds.values())
+
+    def put(self, kind, pk, name):
+        self.kinds[kind].put(pk, name)
+
+    def discard(self, kind, pk):
+        self.kinds[kind].discard(pk)
+
+    def search(self, term, kinds=None, limit=DEFAULT_LIMIT):
+        """[(kind, pk, name)] of the best `limit` matches for `term`."""
+        term = normalize(term)
+        if not term or limit <= 0:
+            return []
+        indexes = [(kind, self.kinds[kind]) for kind in (kinds or KINDS)]
+
+        def tagged(kind, matches):
+            return ((text, kind, pk) for text, pk in matches)
+
+        stages = [
+            lambda: [tagged(kind, index.name_prefix(term)) for kind, index in indexes],
+            lambda: [tagged(kind, index.word_prefix(term)) for kind, index in indexes],
+        ]
+        if len(term) >= 3:
+            stages.append(lambda: [tagged(kind, index.infix(term, limit)) for kind, index in indexes])
+
+        found = {}
+        for stage in stages:
+            matches = ((kind, pk) for _, kind, pk in heapq.merge(*stage()))
+            for key in islice((key for key in matches if key not in found), limit - len(found)):
+                found[key] = None
+            if len(found) >= limit:
+                break
+        return [(kind, pk, self.kinds[kind].names[pk]) for kind, pk in found]
+
+
+class _State:
+    def __init__(self):
+        self.index = None
+        self.generations = {}
+        self.checked_at = 0.0
+        self.loading = False
+        self.lock = threading.Lock()
+
+
+_state = _State()
+
+
+def _current_generations():
+    return dict(zip(MODELS, get_generations(MODELS)))
+
+
+def load(using=DEFAULT_DB_ALIAS):
+    """Build a new index from the database and swap it in; returns its size."""
+    # Counters first: a write that lands while we read shows up as a newer
+    # generation on the next check and triggers another load.
+    generations = _current_generations()
+    index = AutocompleteIndex({
+        kind: model.objects.using(using).values_list('pk', field).iterator()
+        for kind, (model, field) in KINDS.items()
+    })
+    with _state.lock:
+        _state.index = index
+        _state.generations = generations
+        _state.checked_at = time.monotonic()
+    logger.info(f"autocomplete: loaded {len(index)} names")
+    return len(index)
+
+
+def reset():
+    """Forget the index, e.g. between tests; the next suggest() is cold."""
+    with _state.lock:
+        _state.index = None
+        _state.generations = {}
+        _state.checked_at = 0.0
+
+
+def _load_in_background():
+    try:
+        load()
+    except Exception:
+        logger.exception("autocomplete: loading the index failed")
+    finally:
+        connections.close_all()
+        with _state.lock:
+            _state.loading = False
+
+
+def start_loading():
+    """Load (or reload) the index in a daemon thread, unless one is running."""
+    with _state.lock:
+        if _state.loading:
+            return False
+        _state.loading = True
+    threading.Thread(target=_load_in_background, name='autocomplete-load', daemon=True).start()
+    return True
+
+
+def _autoload():
+    # Tests turn this off and call load() themselves: a second thread can't
+    # see the data of an open test transaction.
+    return getattr(settings, 'AUTOCOMPLETE_AUTOLOAD', True)
+
+
+def _check_generations():
+    now = time.monotonic()
+    if now - _state.checked_at < CHECK_INTERVAL:
+        return
+    _state.checked_at = now
+    if _current_generations() != _state.generations and _autoload():
+        start_loading()
+
+
+def suggest(term, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Best matches for `term` as {'type', 'id', 'name'} dicts, and where they
+    came from: 'index', or 'database' while the index is still cold.
+    """
+    if _state.index is None:
+        if _autoload():
+            start_loading()
+        return suggest_from_database(term, kinds, limit), 'database'
+    _check_generations()
+    # Searches take microseconds; the lock keeps them off half-applied writes.
+    with _state.lock:
+        matches = _state.index.search(term, kinds, limit)
+    return [_result(*match) for match in matches], 'index'
+
+
+def suggest_from_database(term, kinds=None, limit=DEFAULT_LIMIT):
+    """What suggest() finds by prefix, straight from the database (no infix)."""
+    term = normalize(term)
+    if not term or limit <= 0:
+        return []
+    matches = []
+    for kind in kinds or KINDS:
+        model, field = KINDS[kind]
+        rows = model.objects.filter(
+            Q(**{f'{field}__istartswith': term}) | Q(**{f'{field}__icontains': f' {term}'})
+        ).order_by(field).values_list('pk', field)[:limit]
+        matches.extend((not normalize(name).startswith(term), normalize(name), kind, pk, name)
+                       for pk, name in rows)
+    return [_result(kind, pk, name) for *_, kind, pk, name in sorted(matches)[:limit]]
+
+
+def _result(kind, pk, name):
+    return {'type': kind, 'id': pk, 'name': name}
+
+
+def _kind_of(instance):
+    for kind, (model, field) in KINDS.items():
+        if isinstance(instance, model):
+            return kind, field
+    raise LookupError(f"{type(instance).__name__} is not indexed for autocomplete")
+
+
+def _apply(model, update):
+    with _state.lock:
+        if _state.index is None:
+            return
+        update(_state.index)
+        # Our own write bumped this counter; a write from another process
+        # to the same model in the same instant is only picked up with the
+        # next one.
+        _state.generations[model] = get_generations([model])[0]
+
+
+def instance_saved(instance):
+    """Apply a committed save of a Product, Category or Customer."""
+    kind, field = _kind_of(instance)
+    pk, name = instance.pk, getattr(instance, field)
+    transaction.on_commit(lambda: _apply(type(instance), lambda index: index.put(kind, pk, name)))
+
+
+def instance_deleted(instance):
+    kind, _ = _kind_of(instance)
+    pk = instance.pk
+    transaction.on_commit(lambda: _apply(type(instance), lambda index: index.discard(kind, pk)))
@@ -0,0 +1,114 @@
+"""
+Response caching for read-only API views, invalidated by generation counters.
+
+Every cached model has a counter in the cache. Cache keys include the
+current counter of each model a view reads, so bumping a counter (once a
+save, delete, bulk import or truncate commits) makes all keys built from
+the old value unreachable. Nothing has to be found and deleted,
+and there is no TTL to tune: a response is served from the cache exactly
+until one of its models changes. Stale entries just age out of the backend.
+
+The backend (CACHE_ALIAS) must be shared by every process that writes or
+serves, or a bump from an import or another worker goes unnoticed; see
+CACHES in ms/settings.py.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+CACHE_ALIAS = 'default'
+GENERATION_KEY = 'trader:generation:{}'
+RESPONSE_KEY = 'trader:response:{view}:{format}:{generations}:{request}'
+# Old generations are never read again; this only bounds how long they
+# occupy the backend.
+RESPONSE_TIMEOUT = 60 * 60 * 24
+
+
+def _generation_key(model):
+    return GENERATION_KEY.format(model._meta.label_lower)
+
+
+def _new_generation():
+    # Starting from the clock rather than 0 means a counter that was evicted
+    # can't come back at a value an old cached response was built with.
+    return time.time_ns()
+
+
+def get_generations(models, cache=None):
+    """Current counter of each model, in order, with a single cache read."""
+    cache = cache or caches[CACHE_ALIAS]
+    keys = [_generation_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            value = _new_generation()
+            # add() so two requests racing on a missing counter agree on it.
+            found[key] = value if cache.add(key, value, timeout=None) else cache.get(key, value)
+    return [found[key] for key in keys]
+
+
+def bump_generation(*models, cache=None):
+    """Invalidate every cached response built from any of `models`."""
+    cache = cache or caches[CACHE_ALIAS]
+    for model in models:
+        key = _generation_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), timeout=None)
+
+
+class CachedResponseMixin:
+    """
+    Cache the rendered GET response of an APIView.
+
+    `cache_models` lists every model the response is built from; a write
+    to any of them invalidates it. The key also covers the view, the URL
+    kwargs, the query string (in any order) and the negotiated format.
+    Only successful, non-streaming responses are stored, and hits are
+    marked with an `X-Cache: HIT` header.
+
+    The response must not depend on the user: there is no per-user key.
+    """
+    cache_models = ()
+    cache_timeout = RESPONSE_TIMEOUT
+    cache_alias = CACHE_ALIAS
+    cached_headers = ('Content-Type', 'Vary', 'Allow')
+
+    def get_cache_key(self, request, *args, **kwargs):
+        cache = caches[self.cache_alias]
+        generations = '.'.join(str(g) for g in get_generations(self.cache_models, cache))
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        request_key = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+        return RESPONSE_KEY.format(
+            view=f'{type(self).__module__}.{type(self).__qualname__}',
+            format=request.accepted_renderer.format,
+            generations=generations,
+            request=request_key,
+        )
+
+    def get(self, request, *args, **kwargs):
+        cache = caches[self.cache_alias]
+        key = self.get_cache_key(request, *args, **kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = super().get(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            response['X-Cache'] = 'MISS'
+            response.add_post_render_callback(lambda rendered: cache.set(
+                key,
+                (rendered.content, {name: rendered[name] for name in self.cached_headers if rendered.has_header(name)}),
+                self.cache_timeout,
+            ))
+        return response
@@ -0,0 +1,71 @@
+"""
+HTTP conditional GET for read-only API views.
+
+A client (or a reverse proxy) that already holds a response sends its
+ETag back in If-None-Match; when the data hasn't changed we answer 304
+Not Modified before any row is loaded, serialized or rendered. The
+validator has to be much cheaper than the response itself:
+
+- views with `cache_models` (see trader.caching) use the generation
+  counters of those models, which costs a cache read and no SQL at all;
+- other views aggregate Max(updated_at) and Count() over the filtered
+  queryset, one indexed query. The count catches deletes, which leave no
+  newer updated_at behind.
+
+There is deliberately no Last-Modified: a delete doesn't move
+Max(updated_at), and If-Modified-Since only has one-second resolution.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .caching import get_generations
+
+
+class ConditionalGetMixin:
+    """
+    Answer GET with 304 when If-None-Match still matches, and send ETag and
+    Cache-Control on full responses.
+
+    The ETag is weak: it identifies the data behind the response, not its
+    exact bytes. It covers the path, query string and negotiated format,
+    so every page and every `?stream` variant has its own.
+
+    `cache_max_age` is how long a shared cache may reuse a response without
+    asking again; the default 0 makes proxies store it but revalidate every
+    time, which with these validators is cheap.
+    """
+    updated_field = 'updated_at'
+    cache_max_age = 0
+
+    def get_validator_state(self):
+        """Something that changes whenever the data behind the response does."""
+        cache_models = getattr(self, 'cache_models', ())
+        if cache_models:
+            return get_generations(cache_models)
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        state = queryset.aggregate(last=Max(self.updated_field), count=Count('pk'))
+        return state['last'], state['count']
+
+    def get_etag(self, request, state):
+        key = '|'.join([
+            f'{type(self).__module__}.{type(self).__qualname__}',
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            repr(state),
+        ])
+        return 'W/' + quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request, self.get_validator_state())
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=self.cache_max_age, must_revalidate=True)
+        return response
@@ -0,0 +1,499 @@
+"""
+Bulk importer for the Northwind CSV archive.
+
+script.py used to call get_or_create() once per CSV row (plus one .get()
+per foreign key), which means thousands of round-trips for the small
+archive and hours for production-size extracts. The importer is now a
+chain of generators instead:
+
+    read (csv rows) -> resolve (FK keys) -> build (validate/parse) -> write
+
+Rows move through it in fixed-size chunks, so memory stays flat no matter
+how large the file is. Each chunk is written with bulk_create() in one
+transaction and then recorded in a checkpoint, so a failed run can resume
+after the last committed chunk. ignore_conflicts keeps re-runs idempotent:
+rows that already exist are left untouched, just like get_or_create().
+"""
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from . import search
+from .caching import bump_generation
+from .models import (
+    Category, Customer, Employee, Shipper, Product, Order, OrderDetail,
+    DailySales, RollupDirtyDay, RollupWatermark,
+)
+from .services import refresh_order_totals
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 5000
+
+# Tables in foreign-key order, mapped to their file in the archive directory.
+CSV_FILES = {
+    'categories': 'categories.csv',
+    'customers': 'customers.csv',
+    'employees': 'employees.csv',
+    'shippers': 'shippers.csv',
+    'products': 'products.csv',
+    'orders': 'orders.csv',
+    'order_details': 'order_details.csv',
+}
+
+
+def parse_date(value):
+    if value and value.strip():
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    return None
+
+
+def parse_decimal(value, default='0'):
+    value = (value or '').strip()
+    return Decimal(value or default)
+
+
+def parse_bool(value):
+    return (value or '0').strip().lower() in ['1', 'true', 'yes']
+
+
+def existing_keys(model):
+    """Primary keys already in the table, loaded in a single query."""
+    return set(model.objects.values_list('pk', flat=True))
+
+
+def read_csv(csv_file_path):
+    with open(csv_file_path, 'r', encoding='utf-8', newline='') as file:
+        yield from csv.DictReader(file)
+
+
+#
+# Row builders: turn one CSV row into an unsaved model instance, or return
+# None (after a warning) when a foreign key can't be resolved.
+#
+
+def build_category(row, keys):
+    return Category(
+        categoryID=int(row['categoryID']),
+        categoryName=row['categoryName'],
+        description=row['description'],
+    )
+
+
+def build_customer(row, keys):
+    return Customer(
+        customerID=row['customerID'],
+        companyName=row['companyName'],
+        contactName=row['contactName'],
+        contactTitle=row.get('contactTitle', ''),
+        city=row['city'],
+        country=row['country'],
+    )
+
+
+def build_employee(row, keys):
+    reports_to = None
+    if row.get('reportsTo') and row['reportsTo'].strip():
+        reports_to = int(row['reportsTo'])
+        if reports_to not in keys['employees']:
+            logger.warning(f"Manager with ID {row['reportsTo']} not found for employee {row['employeeName']}")
+            reports_to = None
+    return Employee(
+        employeeID=int(row['employeeID']),
+        employeeName=row['employeeName'],
+        title=row['title'],
+        city=row['city'],
+        country=row['country'],
+        reportsTo_id=reports_to,
+    )
+
+
+def build_shipper(row, keys):
+    return Shipper(
+        shipperID=int(row['shipperID']),
+        companyName=row['companyName'],
+    )
+
+
+def build_product(row, keys):
+    category_id = int(row['categoryID'])
+    if category_id not in keys['categories']:
+        logger.warning(f"Category ID {row['categoryID']} not found for product {row['productName']}")
+        return None
+    return Product(
+        productID=int(row['productID']),
+        productName=row['productName'],
+        quantityPerUnit=row['quantityPerUnit'],
+        unitPrice=parse_decimal(row['unitPrice']),
+        discontinued=parse_bool(row.get('discontinued')),
+        categoryID_id=category_id,
+    )
+
+
+def build_order(row, keys):
+    employee_id = int(row['employeeID'])
+    shipper_id = int(row['shipperID'])
+    if row['customerID'] not in keys['customers']:
+        logger.warning(f"Customer ID {row['customerID']} not found for order {row['orderID']}")
+        return None
+    if employee_id not in keys['employees']:
+        logger.warning(f"Employee ID {row['employeeID']} not found for order {row['orderID']}")
+        return None
+    if shipper_id not in keys['shippers']:
+        logger.warning(f"Shipper ID {row['shipperID']} not found for order {row['orderID']}")
+        return None
+    return Order(
+        orderID=int(row['orderID']),
+        customerID_id=row['customerID'],
+        employeeID_id=employee_id,
+        orderDate=parse_date(row['orderDate']),
+        requiredDate=parse_date(row['requiredDate']),
+        shippedDate=parse_date(row.get('shippedDate', '')),
+        shipperID_id=shipper_id,
+        freight=parse_decimal(row.get('freight')),
+    )
+
+
+def build_order_detail(row, keys):
+    order_id = int(row['orderID'])
+    product_id = int(row['productID'])
+    if order_id not in keys['orders']:
+        logger.warning(f"Order ID {row['orderID']} not found for order detail")
+        return None
+    if product_id not in keys['products']:
+        logger.warning(f"Product ID {row['productID']} not found for order detail")
+        return None
+    return OrderDetail(
+        orderID_id=order_id,
+        productID_id=product_id,
+        unitPrice=parse_decimal(row['unitPrice']),
+        quantity=int(row['quantity']),
+        discount=parse_decimal(row.get('discount')),
+    )
+
+
+# table name -> (model, row builder, tables whose keys the builder checks)
+TABLES = {
+    'categories': (Category, build_category, []),
+    'customers': (Customer, build_customer, []),
+    'employees': (Employee, build_employee, ['employees']),
+    'shippers': (Shipper, build_shipper, []),
+    'products': (Product, build_product, ['categories']),
+    'orders': (Order, build_order, ['customers', 'employees', 'shippers']),
+    'order_details': (OrderDetail, build_order_detail, ['orders', 'products']),
+}
+
+
+# Parent tables that can grow without bound. Their keys are looked up per
+# chunk (one query) instead of being held in memory for the whole import:
+# table -> CSV column holding the key in child rows.
+CHUNKED_KEYS = {
+    'orders': 'orderID',
+}
+
+# Tables big enough to be split into key ranges that load in parallel
+# (see trader.parallel): table -> CSV column the ranges are taken over.
+SHARD_KEYS = {
+    'order_details': 'orderID',
+}
+
+
+def load_keys(table, csv_file_path):
+    """Key sets for the foreign keys that are small enough to preload."""
+    dependencies = TABLES[table][2]
+    keys = {
+        name: existing_keys(TABLES[name][0])
+        for name in dependencies if name not in CHUNKED_KEYS
+    }
+    if table == 'employees':
+        # reportsTo points into the same file, so managers that appear
+        # later in the CSV count as resolvable too.
+        keys['employees'] |= {int(row['employeeID']) for row in read_csv(csv_file_path)}
+    return keys
+
+
+class Checkpoint:
+    """
+    Rows committed so far for each table, one small JSON file per table.
+
+    The file is replaced atomically after every committed chunk, so it never
+    claims more rows than the database actually holds.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'rows': 0, 'done': False}
+
+    def save(self, key, rows, done=False):
+        path = self._path(key)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump({'rows': rows, 'done': done}, file)
+        os.replace(f"{path}.tmp", path)
+
+    def clear(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+#
+# Pipeline stages. Each one is a generator over chunks, so only one chunk
+# of rows is alive at any time.
+#
+
+def read_chunks(csv_file_path, chunk_size, skip=0, shard=None):
+    """
+    Yield (rows read so far, list of raw CSV rows), skipping the first `skip` rows.
+
+    `shard` is an optional (column, low, high) triple; rows whose key falls
+    outside [low, high) are read past but not yielded. Either bound may be None.
+    """
+    chunk = []
+    position = 0
+    for row in read_csv(csv_file_path):
+        position += 1
+        if position <= skip:
+            continue
+        if shard is not None:
+            column, low, high = shard
+            key = int(row[column])
+            if (low is not None and key < low) or (high is not None and key >= high):
+                continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield position, chunk
+            chunk = []
+    if chunk:
+        yield position, chunk
+
+
+def resolve_chunks(table, chunks, keys):
+    """Look up the keys of unbounded parent tables for each chunk."""
+    dependencies = [name for name in TABLES[table][2] if name in CHUNKED_KEYS]
+    for position, rows in chunks:
+        for name in dependencies:
+            column = CHUNKED_KEYS[name]
+            wanted = {int(row[column]) for row in rows}
+            keys[name] = set(
+                TABLES[name][0].objects.filter(pk__in=wanted).values_list('pk', flat=True)
+            )
+        yield position, rows
+
+
+def build_chunks(table, chunks, keys):
+    """Turn raw rows into unsaved instances, dropping rows that don't validate."""
+    build = TABLES[table][1]
+    for position, rows in chunks:
+        instances = [instance for instance in (build(row, keys) for row in rows) if instance is not None]
+        yield position, len(rows), instances
+
+
+def refresh_chunk_totals(instances):
+    refresh_order_totals({detail.orderID_id for detail in instances})
+
+
+def index_chunk_products(instances):
+    search.index_products([product.pk for product in instances])
+
+
+# Work that must commit together with a chunk's INSERT, because
+# bulk_create() sends no post_save signals.
+AFTER_WRITE = {
+    'products': index_chunk_products,
+    'order_details': refresh_chunk_totals,
+}
+
+
+def write_chunks(table, chunks, batch_size, checkpoint=None, checkpoint_key=None):
+    """Write each chunk in its own transaction and checkpoint it once committed."""
+    model = TABLES[table][0]
+    after_write = AFTER_WRITE.get(table)
+    checkpoint_key = checkpoint_key or table
+    for position, rows, instances in chunks:
+        with transaction.atomic():
+            model.objects.bulk_create(instances, batch_size=batch_size, ignore_conflicts=True)
+            if after_write is not None and instances:
+                after_write(instances)
+        if checkpoint is not None:
+            checkpoint.save(checkpoint_key, position)
+            logger.info(f"{checkpoint_key}: committed {position} rows (checkpoint)")
+        yield position, rows, len(instances)
+
+
+def import_table(table, csv_file_path, batch_size=DEFAULT_BATCH_SIZE,
+                 chunk_size=DEFAULT_CHUNK_SIZE, checkpoint=None, resume=False,
+                 key_range=None, checkpoint_key=None):
+    """
+    Stream one table through the pipeline and return its timing stats.
+
+    With `resume`, rows up to the table's last checkpoint are skipped and a
+    table that already finished is not read again. `key_range` restricts the
+    import to one (low, high) shard of a SHARD_KEYS table; each shard then
+    needs its own `checkpoint_key`. Foreign keys that point at rows later in
+    the same chunk are fine because Django creates them as deferred
+    constraints.
+    """
+    checkpoint_key = checkpoint_key or table
+    logger.info(f"Importing {checkpoint_key}...")
+    start = time.perf_counter()
+
+    skip = 0
+    if checkpoint is not None and resume:
+        state = checkpoint.get(checkpoint_key)
+        if state['done']:
+            logger.info(f"{checkpoint_key}: already imported, skipping")
+            return {'table': table, 'rows': 0, 'written': 0, 'skipped': 0, 'queries': 0,
+                    'resumed_from': state['rows'], 'seconds': 0.0, 'rows_per_sec': None}
+        skip = state['rows']
+        if skip:
+            logger.info(f"{checkpoint_key}: resuming after row {skip}")
+
+    shard = (SHARD_KEYS[table], *key_range) if key_range is not None else None
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        keys = load_keys(table, csv_file_path)
+    chunks = read_chunks(csv_file_path, chunk_size, skip=skip, shard=shard)
+    chunks = resolve_chunks(table, chunks, keys)
+    chunks = build_chunks(table, chunks, keys)
+
+    rows = written = 0
+    position = skip
+    with connection.execute_wrapper(counter):
+        for position, chunk_rows, chunk_written in write_chunks(table, chunks, batch_size, checkpoint, checkpoint_key):
+            rows += chunk_rows
+            written += chunk_written
+    if checkpoint is not None:
+        checkpoint.save(checkpoint_key, position, done=True)
+    if written:
+        # bulk_create() sends no post_save, so cached responses go stale here.
+        transaction.on_commit(lambda: bump_generation(TABLES[table][0]))
+
+    seconds = time.perf_counter() - start
+    stats = {
+        'table': table,
+        'rows': rows,
+        'written': written,
+        'skipped': rows - written,
+        'queries': counter.count,
+        'resumed_from': skip,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(written / seconds, 1) if seconds else None,
+    }
+    logger.info(f"{checkpoint_key}: {stats['written']} rows in {stats['seconds']}s ({stats['rows_per_sec']} rows/sec)")
+    return stats
+
+
+def import_all(data_dir, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+               checkpoint_dir=None, resume=False):
+    """Import every table in foreign-key order; returns a list of per-table stats."""
+    checkpoint = Checkpoint(checkpoint_dir) if checkpoint_dir else None
+    results = []
+    for table, filename in CSV_FILES.items():
+        csv_file_path = os.path.join(data_dir, filename)
+        if not os.path.exists(csv_file_path):
+            logger.warning(f"{csv_file_path} not found!")
+            continue
+        if checkpoint is not None and not resume:
+            checkpoint.clear(table)
+        results.append(import_table(
+            table, csv_file_path, batch_size=batch_size, chunk_size=chunk_size,
+            checkpoint=checkpoint, resume=resume,
+        ))
+    return results
+
+
+class QueryCounter:
+    """execute_wrapper that counts statements; works with DEBUG=False."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def prepare_database():
+    """
+    Let several importer processes write to the same database.
+
+    SQLite only allows one writer at a time; WAL mode lets readers carry on
+    while a chunk is committed, and the busy timeout makes other writers
+    wait for the lock instead of failing with "database is locked".
+    PostgreSQL needs nothing special.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA busy_timeout=60000')
+
+
+# Child tables first, so no row is ever left pointing at a deleted parent.
+# The sales rollup is derived from the rest, so it goes too.
+TRUNCATE_ORDER = [
+    DailySales, RollupDirtyDay, RollupWatermark,
+    OrderDetail, Order, Product, Shipper, Employee, Customer, Category,
+]
+
+
+def truncate_tables(using=DEFAULT_DB_ALIAS):
+    """
+    Empty every Northwind table with raw SQL and reset the id sequences.
+
+    Uses the same statements as `manage.py flush`: a single
+    TRUNCATE ... RESTART IDENTITY on PostgreSQL, DELETE FROM in FK order plus
+    a sqlite_sequence reset on SQLite. Django's cascade collector and the
+    pre/post_delete signals are skipped entirely.
+    """
+    db = connections[using]
+    tables = [model._meta.db_table for model in TRUNCATE_ORDER]
+    db.ops.execute_sql_flush(db.ops.sql_flush(no_style(), tables, reset_sequences=True))
+    search.clear_index(using)
+    transaction.on_commit(lambda: bump_generation(*TRUNCATE_ORDER), using=using)
+
+
+def clear_all_data(fast=False):
+    """
+    Clear all existing data (optional)
+
+    `fast` truncates the tables directly; otherwise every model goes
+    through .delete(), which collects related objects in Python and sends
+    signals but is very slow on large Order/OrderDetail tables.
+    """
+    logger.info("Clearing existing data...")
+    if fast:
+        truncate_tables()
+        logger.info("All data cleared!")
+        return
+    DailySales.objects.all().delete()
+    RollupWatermark.objects.all().delete()
+    RollupDirtyDay.objects.all().delete()
+    # Orders first: their lines go with them, and the totals of orders
+    # being deleted aren't refreshed.
+    Order.objects.all().delete()
+    OrderDetail.objects.all().delete()
+    Product.objects.all().delete()
+    Shipper.objects.all().delete()
+    Employee.objects.all().delete()
+    Customer.objects.all().delete()
+    Category.objects.all().delete()
+    logger.info("All data cleared!")
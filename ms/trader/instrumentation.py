@@ -0,0 +1,107 @@
+"""
+Recording and explaining the SQL that a piece of code runs.
+
+connection.queries is only filled in with DEBUG=True and keeps growing for
+the life of the connection; capture_queries() uses an execute_wrapper
+instead, so it works in any configuration and only sees its own block.
+"""
+import re
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+
+CapturedQuery = namedtuple('CapturedQuery', ['sql', 'params', 'many', 'duration'])
+
+
+class QueryLog:
+    """execute_wrapper that records every statement with its duration."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(CapturedQuery(sql, params, many, time.perf_counter() - start))
+
+
+@contextmanager
+def capture_queries(using=DEFAULT_DB_ALIAS):
+    """
+    with capture_queries() as queries: ...
+
+    `queries` is the list of CapturedQuery run inside the block, in order.
+    """
+    log = QueryLog()
+    with connections[using].execute_wrapper(log):
+        yield log.queries
+
+
+# Literals and IN lists, so statements that only differ in their values
+# share a fingerprint. The ORM already sends parameters separately; this
+# catches raw SQL and IN (%s, %s, ...) lists of different lengths.
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _IN_LISTS.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def is_select(sql):
+    return sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+
+def explain(sql, params=(), using=DEFAULT_DB_ALIAS):
+    """The database's plan for a SELECT, one line per step."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        rows = cursor.fetchall()
+    if connection.vendor != 'sqlite':
+        return [str(row[0]) for row in rows]
+    # EXPLAIN QUERY PLAN rows are (id, parent, notused, detail): indent
+    # each step under its parent.
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return lines
+
+
+# Run views as they are, minus the response cache (which would answer
+# without SQL) and without starting the autocomplete loader. The requests
+# are built here, so any host name is fine.
+VIEW_SETTINGS = override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    AUTOCOMPLETE_AUTOLOAD=False,
+    ALLOWED_HOSTS=['*'],
+)
+
+
+def call_view(name, kwargs=None, query=None):
+    """
+    GET the view of URL `name` in this process, with VIEW_SETTINGS active,
+    and render the response (streamed ones too). Returns the request.
+    """
+    request = RequestFactory().get(reverse(name, kwargs=kwargs), query or {})
+    with VIEW_SETTINGS:
+        match = resolve(request.path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return request
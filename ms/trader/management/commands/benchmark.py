@@ -0,0 +1,244 @@
+import csv
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from trader import autocomplete
+from trader.analytics import refresh_rollup
+from trader.importer import CSV_FILES, import_all, truncate_tables
+from trader.instrumentation import call_view, capture_queries
+from trader.models import Customer, Order, OrderDetail, Product
+from trader.synthetic import base36, generate
+
+# (comparison, strategy, url name, url kwargs, query string). Strategy
+# names are the keys of the JSON results, so keep them stable.
+STRATEGIES = [
+    ('N+1', 'per-row', 'orders-unoptimized', {}, {}),
+    ('N+1', 'select_related', 'orders-optimized', {}, {}),
+    ('only/defer', 'only', 'products-only', {}, {}),
+    ('only/defer', 'defer', 'categories-defer', {}, {}),
+    ('values', 'values', 'products-as-dict', {}, {}),
+    ('values', 'values_list', 'products-as-tuple', {}, {}),
+    ('index', 'indexed', 'test-indexed-search', {}, {'term': 'Chai'}),
+    ('index', 'non-indexed', 'test-non-indexed-search', {}, {}),
+    ('search', 'full-text', 'product-search-q', {}, {'search': 'cha'}),
+    ('search', 'autocomplete', 'autocomplete', {}, {'q': 'cha'}),
+    ('analytics', 'rollup', 'sales-revenue', {'report': 'product'}, {}),
+    ('analytics', 'live', 'sales-revenue', {'report': 'product'}, {'source': 'live'}),
+]
+
+DEFAULT_SCALES = [1, 10, 100]
+# Orders in the archive; --data synthetic generates this many per scale unit.
+ARCHIVE_ORDERS = 830
+# Relative slowdown of the median that --compare reports as a regression.
+DEFAULT_THRESHOLD = 0.25
+
+
+def write_scaled(directory, scale, data_dir=settings.BASE_DIR / 'archive'):
+    """
+    Write `scale` copies of the archive's customers, products, orders and
+    details to `directory`; the lookup tables are written once.
+
+    The first copy keeps the archive's keys. The others get order and
+    product ids shifted past the archive's, and customer ids in lower case
+    ("z" + base 36), which can't clash with the upper-case originals.
+    """
+    directory = Path(directory)
+    tables = {}
+    for table, filename in CSV_FILES.items():
+        with open(data_dir / filename, newline='', encoding='utf-8') as source:
+            reader = csv.DictReader(source)
+            tables[table] = (reader.fieldnames, list(reader))
+    customers = tables['customers'][1]
+    order_span = max(int(row['orderID']) for row in tables['orders'][1])
+    product_span = max(int(row['productID']) for row in tables['products'][1])
+
+    def copies(rows, copy):
+        for row in rows:
+            row = dict(row)
+            if copy:
+                for column, span in (('orderID', order_span), ('productID', product_span)):
+                    if column in row:
+                        row[column] = int(row[column]) + copy * span
+                if 'customerID' in row:
+                    row['customerID'] = customer_ids[copy][row['customerID']]
+            yield row
+
+    customer_ids = [
+        {row['customerID']: row['customerID'] if not copy else 'z' + base36(copy * len(customers) + i)
+         for i, row in enumerate(customers)}
+        for copy in range(scale)
+    ]
+    for table, filename in CSV_FILES.items():
+        fieldnames, rows = tables[table]
+        with open(directory / filename, 'w', newline='', encoding='utf-8') as target:
+            writer = csv.DictWriter(target, fieldnames=fieldnames)
+            writer.writeheader()
+            if table in ('customers', 'products', 'orders', 'order_details'):
+                for copy in range(scale):
+                    writer.writerows(copies(rows, copy))
+            else:
+                writer.writerows(rows)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(run, iterations, warmup):
+    """Median/p95 of `iterations` timed runs, then the queries and peak memory of one more."""
+    for _ in range(warmup):
+        run()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    # Counted and traced apart from the timed runs, which pay for neither.
+    tracemalloc.start()
+    try:
+        with capture_queries() as queries:
+            run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    p95 = statistics.quantiles(samples, n=20, method='inclusive')[-1] if len(samples) > 1 else samples[0]
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(p95, 3),
+        'queries': len(queries),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every ORM strategy endpoint on 1x, 10x and 100x the Northwind "
+        "archive (copies of it, or synthetic data) and report median/p95 "
+        "latency, queries and peak memory. The data is loaded in a "
+        "transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, action='append', dest='scales',
+                            help=f"Multiples of the archive's size to load; may be repeated (default: {DEFAULT_SCALES})")
+        parser.add_argument('--data', choices=['archive', 'synthetic'], default='archive',
+                            help="archive: copies of the archive; synthetic: skewed data from trader.synthetic")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data")
+        parser.add_argument('--strategy', action='append', dest='strategies',
+                            help="Only this strategy; may be repeated")
+        parser.add_argument('--iterations', type=int, default=20, help="Timed runs per strategy")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed runs before them")
+        parser.add_argument('--json', dest='json_path', help="Also write the results as JSON here")
+        parser.add_argument('--markdown', dest='markdown_path', help="Also write the Markdown table here")
+        parser.add_argument('--compare', help="Results JSON of an earlier run to check for regressions")
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help="Median slowdown counted as a regression (0.25: 25%% slower)")
+
+    def handle(self, *args, **options):
+        strategies = [s for s in STRATEGIES if not options['strategies'] or s[1] in options['strategies']]
+        if not strategies:
+            raise CommandError(f"Unknown strategy, use one of: {', '.join(s[1] for s in STRATEGIES)}")
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        scales = options['scales'] or DEFAULT_SCALES
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)['results']
+
+        # The importer's per-table progress is noise here.
+        logging.getLogger('trader').setLevel(logging.WARNING)
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'data': options['data'],
+                'seed': options['seed'] if options['data'] == 'synthetic' else None,
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'rows': {},
+            },
+            'results': {},
+        }
+        for scale in scales:
+            with transaction.atomic():
+                report['meta']['rows'][f'{scale}x'] = self.load(scale, options['data'], options['seed'])
+                for comparison, strategy, name, kwargs, query in strategies:
+                    result = measure(lambda: call_view(name, kwargs, query), options['iterations'], options['warmup'])
+                    report['results'][f'{scale}x/{strategy}'] = {'comparison': comparison, **result}
+                transaction.set_rollback(True)
+            autocomplete.reset()
+
+        regressions = self.compare(report['results'], baseline, options['threshold']) if baseline else []
+        table = self.markdown(report['results'], baseline)
+        self.stdout.write(table)
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        if options['markdown_path']:
+            with open(options['markdown_path'], 'w', encoding='utf-8') as f:
+                f.write(table)
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + '\n'.join(regressions))
+
+    def load(self, scale, data, seed):
+        truncate_tables()
+        with tempfile.TemporaryDirectory() as directory:
+            if data == 'synthetic':
+                generate(directory, ARCHIVE_ORDERS * scale, seed=seed)
+            else:
+                write_scaled(directory, scale)
+            import_all(directory)
+        refresh_rollup(full=True)
+        autocomplete.load()
+        return {model.__name__: model.objects.count() for model in (Customer, Product, Order, OrderDetail)}
+
+    @staticmethod
+    def compare(results, baseline, threshold):
+        regressions = []
+        for key, result in results.items():
+            before = baseline.get(key)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(f"{key}: {before['queries']} -> {result['queries']} queries")
+            if result['median_ms'] > before['median_ms'] * (1 + threshold):
+                regressions.append(f"{key}: median {before['median_ms']} -> {result['median_ms']} ms")
+        return regressions
+
+    @staticmethod
+    def markdown(results, baseline=None):
+        header = ['scale', 'comparison', 'strategy', 'median ms', 'p95 ms', 'queries', 'peak KiB']
+        if baseline:
+            header.append('median vs baseline')
+        lines = ['| ' + ' | '.join(header) + ' |', '|' + '---|' * len(header)]
+        for key, result in results.items():
+            scale, strategy = key.split('/', 1)
+            row = [scale, result['comparison'], strategy, result['median_ms'], result['p95_ms'],
+                   result['queries'], result['peak_kib']]
+            if baseline:
+                before = baseline.get(key)
+                row.append(f"{result['median_ms'] / before['median_ms'] - 1:+.0%}"
+                           if before and before['median_ms'] else '')
+            lines.append('| ' + ' | '.join(str(cell) for cell in row) + ' |')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,100 @@
+import json
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from trader import search
+from trader.models import Category, Product
+
+SYLLABLES = [
+    'ba', 'cha', 'de', 'fi', 'go', 'ka', 'lu', 'ma', 'ne', 'po',
+    'qui', 'ra', 'si', 'to', 'vu', 'wa', 'xe', 'yo', 'za', 'mon',
+]
+
+
+def _timings(run, terms):
+    samples = []
+    matches = 0
+    for term in terms:
+        start = time.perf_counter()
+        matches += len(run(term))
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95)], 3),
+        'matches': matches,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the full-text product search with icontains on a synthetic "
+        "catalog. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000, help="Synthetic products to add")
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--queries', type=int, default=200, help="Search terms to time")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            raise CommandError("This database has no full-text search index.")
+        rng = random.Random(options['seed'])
+        vocabulary = sorted({
+            ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            for _ in range(2000)
+        })
+
+        with transaction.atomic():
+            summary = self.run(rng, vocabulary, options)
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(summary, indent=2))
+
+    def run(self, rng, vocabulary, options):
+        categories = Category.objects.bulk_create(
+            Category(categoryName=f'{rng.choice(vocabulary).title()} goods')
+            for _ in range(options['categories'])
+        )
+        start = time.perf_counter()
+        Product.objects.bulk_create((
+            Product(
+                productName=' '.join(rng.choice(vocabulary).title() for _ in range(rng.randint(1, 3))),
+                quantityPerUnit='1 unit',
+                unitPrice=Decimal(rng.randint(100, 10000)) / 100,
+                categoryID=rng.choice(categories),
+            )
+            for _ in range(options['products'])
+        ), batch_size=1000)
+        insert_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        search.index_products()
+        index_seconds = time.perf_counter() - start
+
+        # Word prefixes, like someone typing into a search box.
+        terms = [rng.choice(vocabulary)[:rng.randint(3, 5)] for _ in range(options['queries'])]
+
+        def icontains(term):
+            return list(Product.objects.filter(
+                Q(productName__icontains=term) | Q(categoryID__categoryName__icontains=term)
+            ).values_list('pk', flat=True))
+
+        return {
+            'products': Product.objects.count(),
+            'queries': len(terms),
+            'backend': search.backend(),
+            'insert_seconds': round(insert_seconds, 3),
+            'index_seconds': round(index_seconds, 3),
+            'icontains': _timings(icontains, terms),
+            # limit=None: every match, the same work icontains does.
+            'fulltext': _timings(lambda term: search.search_products(term, limit=None), terms),
+        }
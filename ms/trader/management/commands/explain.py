@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from trader.instrumentation import call_view, capture_queries, explain, is_select
+from trader.models import Order, OrderDetail
+
+# (url name, url kwargs, query string) for every read-only endpoint.
+ENDPOINTS = [
+    ('orders-unoptimized', {}, {}),
+    ('orders-optimized', {}, {}),
+    ('orders-optimized', {}, {'customer': 'ALFKI'}),
+    ('product-search-q', {}, {'search': 'cha'}),
+    ('products-only', {}, {}),
+    ('categories-defer', {}, {}),
+    ('products-as-dict', {}, {}),
+    ('products-as-tuple', {}, {}),
+    ('test-indexed-search', {}, {'term': 'Chai'}),
+    ('test-non-indexed-search', {}, {}),
+    ('autocomplete', {}, {'q': 'cha'}),
+    ('sales-revenue', {'report': 'product'}, {}),
+    ('sales-revenue', {'report': 'product'}, {'source': 'live'}),
+]
+
+# What 0007_query_pattern_indexes changed: the indexes it added, and the
+# single-column indexes it dropped. The "before" plans put both back.
+ADDED_INDEXES = [
+    'order_customer_date_idx',
+    'detail_product_order_idx',
+    'product_name_idx',
+    'product_active_idx',
+]
+DROPPED_INDEXES = [
+    (Order, 'customerID'),
+    (OrderDetail, 'orderID'),
+    (OrderDetail, 'productID'),
+    (OrderDetail, 'quantity'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the query plan of every SELECT each endpoint runs, before and "
+        "after the indexes of migration 0007. The old schema is recreated in "
+        "a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help="Only this URL name; may be repeated")
+        parser.add_argument('--width', type=int, default=160, help="Shorten SQL to this many characters (0: full)")
+        parser.add_argument('--plan-lines', type=int, default=12, help="Shorten plans to this many lines (0: full)")
+
+    def handle(self, *args, **options):
+        endpoints = [e for e in ENDPOINTS if not options['endpoints'] or e[0] in options['endpoints']]
+        if not endpoints:
+            raise CommandError(f"Unknown endpoint, use one of: {', '.join(dict.fromkeys(e[0] for e in ENDPOINTS))}")
+
+        runs = [self.run(*endpoint) for endpoint in endpoints]
+        statements = {key for _, _, distinct in runs for key, _ in distinct}
+        with transaction.atomic():
+            after = {key: explain(*key) for key in statements}
+            self.restore_old_indexes()
+            before = {key: explain(*key) for key in statements}
+            transaction.set_rollback(True)
+
+        self.plan_lines = options['plan_lines']
+        for path, total, distinct in runs:
+            self.report(path, total, distinct, before, after, options['width'])
+
+    def run(self, name, kwargs, query):
+        with capture_queries() as captured:
+            request = call_view(name, kwargs, query)
+        selects = [q for q in captured if is_select(q.sql)]
+        distinct = {}
+        for query in selects:
+            # N+1 loops run one statement with different ids: keep the
+            # first one and count the rest.
+            distinct.setdefault(query.sql, [(query.sql, tuple(query.params or ())), 0])[1] += 1
+        return request.get_full_path(), len(selects), list(distinct.values())
+
+    def restore_old_indexes(self):
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for name in ADDED_INDEXES:
+                cursor.execute(f'DROP INDEX {quote(name)}')
+            for model, field in DROPPED_INDEXES:
+                column = model._meta.get_field(field).column
+                name = f'old_{model._meta.model_name}_{field}'[:30]
+                cursor.execute(f'CREATE INDEX {quote(name)} ON {quote(model._meta.db_table)} ({quote(column)})')
+
+    def report(self, path, total, distinct, before, after, width):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"GET {path}  ({total} queries, {len(distinct)} distinct)"))
+        for key, count in distinct:
+            sql = ' '.join(key[0].split())
+            shown = sql if not width or len(sql) <= width else sql[:width - 3] + '...'
+            self.stdout.write(f"  [{count}x] {shown}")
+            if before[key] == after[key]:
+                self.write_plan('plan:   ', after[key])
+            else:
+                self.write_plan('before: ', before[key])
+                self.write_plan('after:  ', after[key], self.style.SUCCESS)
+        self.stdout.write('')
+
+    def write_plan(self, label, lines, style=None):
+        if self.plan_lines and len(lines) > self.plan_lines:
+            lines = lines[:self.plan_lines] + [f"... ({len(lines) - self.plan_lines} more lines)"]
+        for i, line in enumerate(lines):
+            text = f"      {label if i == 0 else ' ' * len(label)}{line}"
+            self.stdout.write(style(text) if style else text)
@@ -0,0 +1,40 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trader.synthetic import DEFAULT_DAYS, generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a synthetic Northwind archive of any size, with skewed product "
+        "popularity and bursty customers, for import_northwind --data-dir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Directory to write the CSV files to")
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument('--customers', type=int, help="Default: one per 10 orders")
+        parser.add_argument('--products', type=int, help="Default: one per 100 orders")
+        parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help="Days the orders are spread over")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['orders'] < 1 or options['days'] < 1:
+            raise CommandError("--orders and --days must be at least 1.")
+        start = time.perf_counter()
+        try:
+            rows = generate(
+                options['output'], options['orders'], seed=options['seed'], customers=options['customers'],
+                products=options['products'], days=options['days'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        seconds = time.perf_counter() - start
+        self.stdout.write(json.dumps({
+            'output': options['output'],
+            'seed': options['seed'],
+            'rows': rows,
+            'seconds': round(seconds, 3),
+        }, indent=2))
@@ -0,0 +1,126 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from trader.analytics import refresh_rollup
+from trader.importer import (
+    DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, clear_all_data, import_all,
+)
+from trader.parallel import import_parallel
+
+
+class Command(BaseCommand):
+    help = (
+        "Import the Northwind CSV archive and print a JSON summary with "
+        "per-table timings, query counts and rows/sec."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'archive'),
+                            help="Directory holding the Northwind CSV files")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Rows per bulk INSERT")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Rows committed per transaction")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Load independent tables in N processes")
+        parser.add_argument('--truncate', action='store_true',
+                            help="Delete existing Northwind data before importing")
+        parser.add_argument('--truncate-mode', choices=['fast', 'orm'], default='fast',
+                            help="fast: raw DELETE/TRUNCATE in FK order with sequence reset; "
+                                 "orm: Model.delete() with cascades and signals")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Run the whole import in a transaction and roll it back")
+        parser.add_argument('--resume', action='store_true',
+                            help="Continue after the last committed chunk")
+        parser.add_argument('--checkpoint-dir', default=str(settings.BASE_DIR / '.import_checkpoints'),
+                            help="Where committed chunks are recorded")
+        parser.add_argument('--profile', action='store_true',
+                            help="Run under cProfile and print the top functions to stderr")
+
+    def handle(self, *args, **options):
+        # Progress goes to stderr so stdout stays a clean JSON document.
+        handler = logging.StreamHandler(self.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        log = logging.getLogger('trader')
+        log.addHandler(handler)
+        log.setLevel(logging.INFO if options['verbosity'] > 1 else logging.WARNING)
+        try:
+            summary = self.run(options)
+        finally:
+            log.removeHandler(handler)
+        self.stdout.write(json.dumps(summary, indent=2))
+
+    def run(self, options):
+        workers = options['workers']
+        if options['dry_run'] and workers > 1:
+            # A rollback can only cover work done on this connection.
+            self.stderr.write("--dry-run runs in a single process; ignoring --workers.")
+            workers = 1
+
+        import_options = dict(
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+            checkpoint_dir=None if options['dry_run'] else options['checkpoint_dir'],
+            resume=options['resume'],
+        )
+
+        def run_import():
+            if options['truncate']:
+                clear_all_data(fast=options['truncate_mode'] == 'fast')
+            if workers > 1:
+                tables = import_parallel(options['data_dir'], workers, **import_options)
+            else:
+                tables = import_all(options['data_dir'], **import_options)
+            # bulk_create() bypasses everything the rollup could hook into,
+            # so fold the new orders in once the import is done.
+            rollup_start = time.perf_counter()
+            rollup = {'days': refresh_rollup()}
+            rollup['seconds'] = round(time.perf_counter() - rollup_start, 4)
+            return tables, rollup
+
+        profiler = cProfile.Profile() if options['profile'] else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            if options['dry_run']:
+                with transaction.atomic():
+                    tables, rollup = run_import()
+                    transaction.set_rollback(True)
+            else:
+                tables, rollup = run_import()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        seconds = time.perf_counter() - start
+
+        if profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(25)
+            self.stderr.write(stream.getvalue())
+
+        written = sum(t['written'] for t in tables)
+        return {
+            'data_dir': options['data_dir'],
+            'workers': workers,
+            'batch_size': options['batch_size'],
+            'chunk_size': options['chunk_size'],
+            'truncate': options['truncate'] and options['truncate_mode'],
+            'dry_run': options['dry_run'],
+            'resume': options['resume'],
+            'seconds': round(seconds, 4),
+            'rows': sum(t['rows'] for t in tables),
+            'written': written,
+            'queries': sum(t['queries'] for t in tables),
+            'rows_per_sec': round(written / seconds, 1) if seconds else None,
+            'tables': tables,
+            'sales_rollup': rollup,
+        }
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from trader.analytics import refresh_rollup
+
+
+class Command(BaseCommand):
+    help = "Fold new orders into the DailySales rollup (or rebuild it with --full)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every day from scratch")
+        parser.add_argument('--day', action='append', type=parse_date, dest='days',
+                            help="Rebuild one day (YYYY-MM-DD); may be repeated")
+
+    def handle(self, *args, **options):
+        rebuilt = refresh_rollup(full=options['full'], days=options['days'])
+        self.stdout.write(f"Rebuilt {rebuilt} day(s) of sales rollup.")
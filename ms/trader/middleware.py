@@ -1,33 +1,128 @@
-import cProfile
-import pstats
-import io
-from django.http import HttpResponse
+import logging
+import random
+import sys
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+from . import profiling
+from .instrumentation import fingerprint
+from .profiling import sampler
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfilerMiddleware:
+    """
+    Profiles a random PROFILER_SAMPLE_RATE share of the requests, and any
+    request with ?profile, with the stack sampler in trader.profiling.
+    The samples add up per URL pattern; staff download them as a
+    flamegraph from /admin/profile/.
+    """
 
-class cProfileMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if 'profile' in request.GET:
-            prof = cProfile.Profile()
-            prof.enable()
-            response = self.get_response(request)
+        if 'profile' not in request.GET and random.random() >= getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0):
+            return self.get_response(request)
+
+        sampler.start(sys._getframe())
+        try:
+            return self.get_response(request)
+        finally:
+            match = request.resolver_match
+            sampler.stop(match.route if match else '<unmatched>')
+            profiling.flush()
+
+
+def _project_packages():
+    return {
+        config.name.split('.')[0] for config in apps.get_app_configs()
+        if Path(config.path).is_relative_to(settings.BASE_DIR)
+    }
+
 
-            prof.disable()
+def _culprit(frame):
+    """
+    "file:line in function" for the code that ran a query: the innermost
+    frame of this project's apps, or else the innermost frame outside the
+    ORM (e.g. the DRF field that followed a relation). The walk stops at
+    NPlusOneMiddleware; the frames outside it are the request pipeline.
+    """
+    project = _project_packages()
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module == __name__:
+            break
+        if not module.startswith('django.db'):
+            code = frame.f_code
+            try:
+                filename = Path(code.co_filename).relative_to(settings.BASE_DIR)
+            except ValueError:
+                filename = code.co_filename
+            location = f"{filename}:{frame.f_lineno} in {code.co_name}"
+            if module.split('.')[0] in project:
+                return location
+            fallback = fallback or location
+        frame = frame.f_back
+    return fallback
 
-            s = io.StringIO()
 
-            ps = pstats.Stats(prof, stream=s).sort_stats('cumulative')
+class QueryRepeatCounter:
+    """
+    execute_wrapper that counts statements by fingerprint and remembers
+    where a fingerprint was when it went past `threshold`.
+    """
 
-            ps.print_stats(25)
-            print("="*50)
-            print(f"cProfile results for: {request.path}")
-            print("="*50)
-            print(s.getvalue())
-            print("="*50)
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.culprits = {}
+        self._fingerprints = {}
 
-        else:
-      
+    def __call__(self, execute, sql, params, many, context):
+        key = self._fingerprints.get(sql)
+        if key is None:
+            key = self._fingerprints[sql] = fingerprint(sql)
+        self.counts[key] += 1
+        if self.counts[key] == self.threshold + 1:
+            # Walked once per repeated statement, not per query
+            self.culprits[key] = _culprit(sys._getframe(1))
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        """[(fingerprint, count, culprit)] of the statements past the threshold."""
+        return [(key, self.counts[key], culprit) for key, culprit in self.culprits.items()]
+
+
+class NPlusOneMiddleware:
+    """
+    Flags requests that run one statement over and over: a query per row
+    of a list is the usual N+1. Cheap enough for production, where it
+    watches a random NPLUSONE_SAMPLE_RATE of the requests and logs a
+    warning per statement repeated more than NPLUSONE_THRESHOLD times,
+    with the line of code that ran it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= getattr(settings, 'NPLUSONE_SAMPLE_RATE', 0.0):
+            return self.get_response(request)
+
+        counter = QueryRepeatCounter(getattr(settings, 'NPLUSONE_THRESHOLD', 10))
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
             response = self.get_response(request)
-            
-        return response
\ No newline at end of file
+
+        for key, count, culprit in counter.repeated():
+            logger.warning(f"N+1 in {request.method} {request.path}: {count}x {key} (at {culprit})")
+        return response
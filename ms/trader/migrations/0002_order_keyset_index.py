@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trader', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='order',
+            options={'ordering': ['-orderDate', '-orderID']},
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-orderDate', '-orderID'], name='order_date_id_idx'),
+        ),
+    ]
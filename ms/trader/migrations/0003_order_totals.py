@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:53
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model('trader', 'Order')
+    OrderDetail = apps.get_model('trader', 'OrderDetail')
+    money = DecimalField(max_digits=14, decimal_places=4)
+    lines = OrderDetail.objects.filter(orderID=OuterRef('pk')).order_by().values('orderID')
+
+    def aggregate(expression, output_field):
+        return Coalesce(
+            Subquery(lines.annotate(value=expression).values('value'), output_field=output_field),
+            Value(0),
+            output_field=output_field,
+        )
+
+    Order.objects.update(
+        subtotal=aggregate(Sum(F('unitPrice') * F('quantity'), output_field=money), money),
+        discount_total=aggregate(Sum(F('unitPrice') * F('quantity') * F('discount'), output_field=money), money),
+        line_count=aggregate(Count('pk'), models.IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trader', '0002_order_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount_total',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trader', '0003_order_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_order_id', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('product', 'Product'), ('category', 'Category'), ('employee', 'Employee'), ('country', 'Customer country')], max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('label', models.CharField(max_length=100)),
+                ('revenue', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('quantity', models.PositiveIntegerField()),
+                ('lines', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Sales',
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'day', 'key'), name='daily_sales_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Name and category name of every product, as (id, name, category).
+SOURCE = '''
+    SELECT p."productID", p."productName", COALESCE(c."categoryName", '')
+    FROM trader_product p LEFT JOIN trader_category c ON c."categoryID" = p."categoryID_id"
+'''
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # prefix='2 3': extra index entries for 2- and 3-letter prefixes, so
+        # short type-ahead terms don't scan the term list.
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE trader_product_fts USING fts5("
+            "name, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(f'INSERT INTO trader_product_fts (rowid, name, category) {SOURCE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE trader_product_search (product_id integer PRIMARY KEY, document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX trader_product_search_gin ON trader_product_search USING GIN (document)'
+        )
+        schema_editor.execute(f'''
+            INSERT INTO trader_product_search (product_id, document)
+            SELECT id, setweight(to_tsvector('simple', name), 'A') ||
+                       setweight(to_tsvector('simple', category), 'B')
+            FROM ({SOURCE}) AS source (id, name, category)
+        ''')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE trader_product_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE trader_product_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trader', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
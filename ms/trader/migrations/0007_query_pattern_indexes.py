@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trader', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='customerID',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='trader.customer'),
+        ),
+        migrations.AlterField(
+            model_name='orderdetail',
+            name='orderID',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_details', to='trader.order'),
+        ),
+        migrations.AlterField(
+            model_name='orderdetail',
+            name='productID',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_details', to='trader.product'),
+        ),
+        migrations.AlterField(
+            model_name='orderdetail',
+            name='quantity',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customerID', '-orderDate', '-orderID'], name='order_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderdetail',
+            index=models.Index(fields=['productID', 'orderID'], name='detail_product_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['productName'], name='product_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('discontinued', False)), fields=['categoryID', 'productName'], name='product_active_idx'),
+        ),
+    ]
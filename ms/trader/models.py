@@ -1,9 +1,13 @@
 from django.db import models
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 
 class Category(models.Model):
     categoryID = models.AutoField(primary_key=True)
     categoryName = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
+    # Bumped on every save; read by the conditional GET validators.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.categoryName
@@ -19,6 +23,7 @@ class Customer(models.Model):
     contactTitle = models.CharField(max_length=100, blank=True, null=True)
     city = models.CharField(max_length=100)
     country = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.companyName
@@ -37,6 +42,7 @@ class Employee(models.Model):
         null=True,
         related_name='subordinates'
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.employeeName
@@ -45,6 +51,7 @@ class Employee(models.Model):
 class Shipper(models.Model):
     shipperID = models.AutoField(primary_key=True)
     companyName = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.companyName
@@ -61,17 +68,66 @@ class Product(models.Model):
         on_delete=models.CASCADE,
         related_name='products'
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.productName
 
+    class Meta:
+        indexes = [
+            # Exact-name lookups (/api/9-test-indexed-search/).
+            models.Index(fields=['productName'], name='product_name_idx'),
+            # The sellable catalog: only rows with discontinued = false are
+            # stored, grouped by category and sorted by name.
+            models.Index(
+                fields=['categoryID', 'productName'],
+                condition=Q(discontinued=False),
+                name='product_active_idx',
+            ),
+        ]
+
+
+class OrderQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        """
+        Annotate computed_subtotal, computed_discount_total and
+        computed_line_count straight from order_details, for ad-hoc queries
+        and for checking the stored columns; each is a correlated subquery,
+        so it can be combined with other annotations and joins.
+        """
+        return self.annotate(**order_totals_expressions())
+
+
+def order_totals_expressions(prefix='computed_'):
+    """Subquery expressions that aggregate an order's detail rows."""
+    money = DecimalField(max_digits=14, decimal_places=4)
+    lines = OrderDetail.objects.filter(orderID=OuterRef('pk')).order_by().values('orderID')
+
+    def aggregate(expression, output_field):
+        return Coalesce(
+            Subquery(lines.annotate(value=expression).values('value'), output_field=output_field),
+            Value(0),
+            output_field=output_field,
+        )
+
+    return {
+        f'{prefix}subtotal': aggregate(Sum(F('unitPrice') * F('quantity'), output_field=money), money),
+        f'{prefix}discount_total': aggregate(
+            Sum(F('unitPrice') * F('quantity') * F('discount'), output_field=money), money
+        ),
+        f'{prefix}line_count': aggregate(Count('pk'), models.IntegerField()),
+    }
+
 
 class Order(models.Model):
     orderID = models.AutoField(primary_key=True)
     customerID = models.ForeignKey(
         Customer, 
         on_delete=models.CASCADE,
-        related_name='orders'
+        related_name='orders',
+        # order_customer_date_idx starts with this column
+        db_index=False,
     )
     employeeID = models.ForeignKey(
         Employee, 
@@ -89,36 +145,132 @@ class Order(models.Model):
         related_name='orders'
     )
     freight = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Denormalized from order_details and kept in sync by
+    # trader.services.refresh_order_totals(), so revenue queries read the
+    # order row instead of every detail row.
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    line_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = OrderQuerySet.as_manager()
 
     def __str__(self):
         return f"Order {self.orderID}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The day the sales rollup has this order under, so a save that
+        # moves it can mark both days stale (trader.signals).
+        instance._loaded_order_date = instance.__dict__.get('orderDate')
+        return instance
+
+    @property
+    def total(self):
+        return self.subtotal - self.discount_total
+
     class Meta:
-        ordering = ['-orderDate']
+        ordering = ['-orderDate', '-orderID']
+        indexes = [
+            # Serves the default ordering and keyset pagination on it.
+            models.Index(fields=['-orderDate', '-orderID'], name='order_date_id_idx'),
+            # One customer's orders, newest first: the same ordering, so
+            # ?customer= pages are an index range scan too.
+            models.Index(fields=['customerID', '-orderDate', '-orderID'], name='order_customer_date_idx'),
+        ]
 
 
 class OrderDetail(models.Model):
     orderID = models.ForeignKey(
         Order, 
         on_delete=models.CASCADE,
-        related_name='order_details'
+        related_name='order_details',
+        # the unique (orderID, productID) index starts with this column
+        db_index=False,
     )
     productID = models.ForeignKey(
         Product, 
         on_delete=models.CASCADE,
-        related_name='order_details'
+        related_name='order_details',
+        # detail_product_order_idx starts with this column
+        db_index=False,
     )
     unitPrice = models.DecimalField(max_digits=10, decimal_places=2 )
-    quantity = models.PositiveIntegerField(db_index=True)
+    quantity = models.PositiveIntegerField()
     discount = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Order {self.orderID} - Product {self.productID}"
 
     class Meta:
+        # The unique index covers (orderID, productID) lookups; the other
+        # index serves the reverse direction (a product's order lines).
         unique_together = ['orderID', 'productID']
+        indexes = [
+            models.Index(fields=['productID', 'orderID'], name='detail_product_order_idx'),
+        ]
         verbose_name_plural = "Order Details"
 
     @property
     def total_price(self):
-        return (self.unitPrice * self.quantity) * (1 - self.discount)
\ No newline at end of file
+        return (self.unitPrice * self.quantity) * (1 - self.discount)
+
+class DailySales(models.Model):
+    """
+    Daily revenue rollup, one row per (day, dimension, key).
+
+    Each dimension partitions the same revenue differently (by product,
+    category, employee, customer country, or 'total' for the whole day), so
+    dashboards sum a few hundred rollup rows instead of scanning
+    OrderDetail. Maintained by trader.analytics.refresh_rollup().
+    """
+    DIMENSIONS = [
+        ('total', 'Total'),
+        ('product', 'Product'),
+        ('category', 'Category'),
+        ('employee', 'Employee'),
+        ('country', 'Customer country'),
+    ]
+
+    day = models.DateField()
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    # NULL for orders without an employee, as in live_revenue()
+    key = models.CharField(max_length=100, null=True)
+    label = models.CharField(max_length=100, null=True)
+    revenue = models.DecimalField(max_digits=16, decimal_places=4)
+    quantity = models.PositiveIntegerField()
+    lines = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.day} {self.dimension}={self.label}: {self.revenue}"
+
+    class Meta:
+        verbose_name_plural = "Daily Sales"
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'day', 'key'], name='daily_sales_unique'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Highest orderID already folded into a rollup."""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_order_id = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_order_id}"
+
+
+class RollupDirtyDay(models.Model):
+    """A day of a rollup whose orders changed after it was built."""
+    name = models.CharField(max_length=50)
+    day = models.DateField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.day}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'day'], name='rollup_dirty_day_unique'),
+        ]
@@ -0,0 +1,155 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a fixed, unique ordering.
+
+    PageNumberPagination runs COUNT(*) and then OFFSET n, so page 500 makes
+    the database walk past every earlier row. Here the cursor holds the
+    ordering values of the last row that was sent, and the next page is a
+    plain `WHERE (key) < (cursor) ORDER BY key LIMIT n` that an index on
+    the ordering columns answers directly: page N costs the same as page 1,
+    and no count query is issued.
+
+    `ordering` must end with a unique column so every row has exactly one
+    position.
+    """
+    ordering = None
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering if not reverse else [self._flip(f) for f in self.ordering]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(queryset.model, ordering, values))
+
+        # One extra row tells us whether there is another page.
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.page = rows
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    # -- cursor encoding -------------------------------------------------
+
+    def _link(self, row, reverse):
+        values = [self._value(row, field.lstrip('-')) for field in self.ordering]
+        payload = json.dumps({'v': values, 'r': reverse}, default=str, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            values = payload['v']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return values, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _value(row, name):
+        value = getattr(row, name)
+        return getattr(value, 'pk', value)
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def _seek(self, model, ordering, values):
+        """
+        Rows strictly after `values` in `ordering`, i.e. the row-value
+        comparison (a, b) < (x, y) written as
+
+            a <= x AND (a < x OR (a = x AND b < y))
+
+        The leading range on the first column lets the index seek straight
+        to the cursor instead of scanning from the top.
+        """
+        names = [field.lstrip('-') for field in ordering]
+        try:
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(names, values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+        after = Q()
+        for i, field in enumerate(ordering):
+            op = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{names[i]}__{op}': values[i]})
+            for name, value in zip(names[:i], values[:i]):
+                step &= Q(**{name: value})
+            after |= step
+        first_op = 'lte' if ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{names[0]}__{first_op}': values[0]}) & after
+
+
+class OrderKeysetPagination(KeysetPagination):
+    """Newest orders first, matching Order.Meta.ordering and its index."""
+    ordering = ('-orderDate', '-orderID')
@@ -0,0 +1,142 @@
+"""
+Multi-process scheduler for the Northwind importer.
+
+Tables are started as soon as every table they reference has been
+committed, so categories, customers, employees and shippers load at the
+same time, and products/orders follow as soon as their parents are done.
+order_details is split into orderID ranges that load in parallel once
+orders are in the database.
+
+Workers are spawned (not forked) processes, so nothing here imports the
+ORM at module level: the pool unpickles these functions before Django has
+been set up in the child.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker(log_level=logging.INFO):
+    import django
+    django.setup()
+    logging.basicConfig(level=log_level, format='%(message)s')
+
+    from .importer import prepare_database
+    prepare_database()
+
+
+def run_table(table, csv_file_path, options, key_range=None, checkpoint_key=None):
+    """Import one table, or one shard of it, inside a worker process."""
+    from .importer import Checkpoint, import_table
+
+    options = dict(options)
+    checkpoint_dir = options.pop('checkpoint_dir', None)
+    checkpoint = Checkpoint(checkpoint_dir) if checkpoint_dir else None
+    if checkpoint is not None and not options.get('resume'):
+        checkpoint.clear(checkpoint_key or table)
+    return import_table(
+        table, csv_file_path, checkpoint=checkpoint,
+        key_range=key_range, checkpoint_key=checkpoint_key, **options
+    )
+
+
+def shard_ranges(low, high, count):
+    """
+    Split the key range [low, high] into `count` (low, high) shards.
+
+    The outer bounds are left open (None) so rows with keys outside the
+    parent table still reach a shard and get reported as unresolved.
+    """
+    if low is None or count <= 1:
+        return [(None, None)]
+    count = min(count, high - low + 1)
+    bounds = [low + (high - low + 1) * i // count for i in range(count + 1)]
+    bounds[0] = bounds[-1] = None
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def merge_stats(table, results, seconds):
+    written = sum(r['written'] for r in results)
+    rows = sum(r['rows'] for r in results)
+    return {
+        'table': table,
+        'rows': rows,
+        'written': written,
+        'skipped': rows - written,
+        'queries': sum(r['queries'] for r in results),
+        'resumed_from': sum(r['resumed_from'] for r in results),
+        'shards': len(results),
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(written / seconds, 1) if seconds else None,
+    }
+
+
+def import_parallel(data_dir, workers, **options):
+    """
+    Import every table using a pool of `workers` processes.
+
+    `options` are passed through to import_table() (batch_size, chunk_size,
+    resume) plus `checkpoint_dir`. Returns per-table stats in the order the
+    tables finished.
+    """
+    from django.db import connections
+    from django.db.models import Max, Min
+
+    from .importer import CSV_FILES, SHARD_KEYS, TABLES, prepare_database
+
+    paths = {}
+    for table, filename in CSV_FILES.items():
+        csv_file_path = os.path.join(data_dir, filename)
+        if os.path.exists(csv_file_path):
+            paths[table] = csv_file_path
+        else:
+            logger.warning(f"{csv_file_path} not found!")
+    requires = {
+        table: {name for name in TABLES[table][2] if name != table and name in paths}
+        for table in paths
+    }
+
+    # Switch SQLite to WAL before any worker opens the file.
+    prepare_database()
+    connections.close_all()
+
+    running = {}
+    pending = {}
+    started = {}
+    results = []
+    done = set()
+    context = multiprocessing.get_context('spawn')
+    log_level = logging.getLogger('trader').getEffectiveLevel()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_worker, initargs=(log_level,)) as pool:
+        while len(done) < len(paths):
+            for table in paths:
+                if table in done or table in started or not requires[table] <= done:
+                    continue
+                started[table] = time.perf_counter()
+                if table in SHARD_KEYS:
+                    parent = TABLES[table][0]._meta.get_field(SHARD_KEYS[table]).related_model
+                    bounds = parent.objects.aggregate(low=Min('pk'), high=Max('pk'))
+                    shards = shard_ranges(bounds['low'], bounds['high'], workers)
+                else:
+                    shards = [None]
+                pending[table] = []
+                for index, key_range in enumerate(shards):
+                    checkpoint_key = f"{table}.{index + 1}of{len(shards)}" if key_range else None
+                    future = pool.submit(run_table, table, paths[table], options, key_range, checkpoint_key)
+                    running[future] = table
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table = running.pop(future)
+                pending[table].append(future.result())
+                if table not in running.values():
+                    seconds = time.perf_counter() - started[table]
+                    results.append(merge_stats(table, pending.pop(table), seconds))
+                    done.add(table)
+    return results
@@ -0,0 +1,201 @@
+"""
+Statistical profiler for a sample of live requests.
+
+cProfile traces every function call, which makes a request several times
+slower and only describes that one request. Here a single daemon thread
+instead wakes every PROFILER_INTERVAL seconds and reads the stacks of the
+threads that are serving a profiled request (sys._current_frames()); each
+stack read is one sample. The cost is per sample, not per call, and there
+is none at all while no profiled request is running.
+
+Samples are wall-clock: a request waiting on the database is sampled in
+the driver call, which is usually the answer to "where did the time go".
+They are added up per URL pattern in the collapsed-stack format that
+flamegraph.pl, speedscope and inferno read: "frame;frame;frame count".
+
+Each process samples its own requests. With several worker processes
+(gunicorn), set PROFILER_DIR to a directory they share: every process adds
+its new samples to its own file there at most every
+PROFILER_FLUSH_INTERVAL seconds, and the download adds up all the files.
+Without it, /admin/profile/ only shows the process that serves it.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+# Seconds between two samples (100 Hz).
+DEFAULT_INTERVAL = 0.01
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class StackSampler:
+
+    def __init__(self):
+        self.active = {}                     # thread id -> (root frame, Counter of stacks)
+        self.profiles = defaultdict(Counter)  # route -> Counter of stacks
+        self.requests = Counter()            # route -> profiled requests
+        self.lock = threading.Lock()
+        self._labels = {}                    # code object -> "module:qualname"
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, root):
+        """Sample the current thread below `root`, the caller's frame, until stop()."""
+        with self.lock:
+            self.active[threading.get_ident()] = (root, Counter())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, route):
+        """Stop sampling the current thread and add its samples to `route`."""
+        with self.lock:
+            _, stacks = self.active.pop(threading.get_ident())
+            self.profiles[route].update(stacks)
+            self.requests[route] += 1
+
+    def _run(self):
+        while True:
+            if not self.active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(getattr(settings, 'PROFILER_INTERVAL', DEFAULT_INTERVAL))
+            self.sample()
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self.lock:
+            for ident, (root, stacks) in self.active.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks[self._stack(frame, root)] += 1
+
+    def _label(self, code, module):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{module}:{code.co_qualname}".replace(';', ',').replace(' ', '_')
+        return label
+
+    def _stack(self, frame, root):
+        labels = []
+        while frame is not None and frame is not root:
+            labels.append(self._label(frame.f_code, frame.f_globals.get('__name__', '?')))
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def collapsed(self, route=None):
+        """The samples as collapsed stacks, each under its route as the root frame."""
+        with self.lock:
+            lines = [
+                f"{name};{stack} {count}" if stack else f"{name} {count}"
+                for name, stacks in sorted(self.profiles.items())
+                if route is None or name == route
+                for stack, count in stacks.most_common()
+            ]
+        return ''.join(line + '\n' for line in lines)
+
+    def summary(self):
+        """route -> (profiled requests, samples)."""
+        with self.lock:
+            return {route: (self.requests[route], sum(self.profiles[route].values())) for route in self.requests}
+
+    def reset(self):
+        with self.lock:
+            self.profiles.clear()
+            self.requests.clear()
+
+    def take(self):
+        """The samples so far as a JSON-ready snapshot, and start over."""
+        with self.lock:
+            snapshot = {
+                'profiles': {route: dict(stacks) for route, stacks in self.profiles.items()},
+                'requests': dict(self.requests),
+            }
+            self.profiles.clear()
+            self.requests.clear()
+        return snapshot
+
+    def merge(self, snapshot):
+        with self.lock:
+            for route, stacks in snapshot['profiles'].items():
+                self.profiles[route].update(stacks)
+            self.requests.update(snapshot['requests'])
+
+
+sampler = StackSampler()
+_flushed_at = 0.0
+_flush_lock = threading.Lock()
+
+
+def _directory():
+    directory = getattr(settings, 'PROFILER_DIR', None)
+    return Path(directory) if directory else None
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        # Gone or replaced while we listed the directory
+        return None
+
+
+def flush(force=False):
+    """Add this process's new samples to its file in PROFILER_DIR, at most once per interval."""
+    global _flushed_at
+    directory = _directory()
+    if directory is None:
+        return
+    now = time.monotonic()
+    if not force and now - _flushed_at < getattr(settings, 'PROFILER_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL):
+        return
+    with _flush_lock:
+        _flushed_at = now
+        new = sampler.take()
+        if not new['requests']:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}.json'
+        total = StackSampler()
+        previous = _read(path)
+        if previous is not None:
+            total.merge(previous)
+        total.merge(new)
+        # Write then rename, so a download never reads half a file.
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(total.take(), f)
+        os.replace(tmp, path)
+
+
+def collect():
+    """Every process's samples added up (just this one's without PROFILER_DIR)."""
+    directory = _directory()
+    if directory is None:
+        return sampler
+    flush(force=True)
+    total = StackSampler()
+    for path in directory.glob('*.json'):
+        snapshot = _read(path)
+        if snapshot is not None:
+            total.merge(snapshot)
+    return total
+
+
+def clear():
+    """Start over in every process. Samples that other processes haven't flushed yet survive."""
+    with _flush_lock:
+        sampler.reset()
+        directory = _directory()
+        if directory is not None:
+            for path in directory.glob('*.json'):
+                path.unlink(missing_ok=True)
@@ -0,0 +1,151 @@
+"""
+Full-text product search.
+
+`productName__icontains=term` compiles to LIKE '%term%', which no B-tree
+index can answer, so every search reads the whole product/category join.
+Instead each product's name and category name are kept in a full-text
+index (created by migration 0006), chosen by database vendor:
+
+- SQLite: an FTS5 virtual table keyed by rowid = productID, with prefix
+  indexes so type-ahead terms like "cha" are an index lookup too, ranked
+  with bm25();
+- PostgreSQL: a table of tsvectors with a GIN index, ranked with ts_rank().
+
+Every term must match the start of a word in the name or category name
+(so "cha bev" finds "Chai" in "Beverages"), and name matches rank above
+category matches. Other databases have no index, and search_products()
+returns None so callers can fall back to icontains.
+
+The index is updated by signals on Product/Category saves and deletes, by
+the importer after each products chunk, and cleared by truncate_tables().
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import Product
+
+SQLITE_TABLE = 'trader_product_fts'
+POSTGRES_TABLE = 'trader_product_search'
+
+# Ranked matches returned per search.
+SEARCH_LIMIT = 500
+
+# Product and Category tables and columns, as created by 0001_initial.
+_SOURCE = '''
+    FROM trader_product p LEFT JOIN trader_category c ON c."categoryID" = p."categoryID_id"
+'''
+
+
+def backend(using=DEFAULT_DB_ALIAS):
+    """'sqlite', 'postgresql', or None when the database has no search index."""
+    vendor = connections[using].vendor
+    return vendor if vendor in ('sqlite', 'postgresql') else None
+
+
+def _terms(term):
+    return re.findall(r'\w+', term.lower())
+
+
+def _id_filter(product_ids, column):
+    if product_ids is None:
+        return '', []
+    product_ids = list(product_ids)
+    return f' WHERE {column} IN ({", ".join(["%s"] * len(product_ids))})', product_ids
+
+
+def index_products(product_ids=None, using=DEFAULT_DB_ALIAS):
+    """(Re)index the given products, or every product when `product_ids` is None."""
+    kind = backend(using)
+    if kind is None or product_ids is not None and not product_ids:
+        return
+    remove_products(product_ids, using)
+    where, params = _id_filter(product_ids, 'p."productID"')
+    if kind == 'sqlite':
+        sql = f'''
+            INSERT INTO {SQLITE_TABLE} (rowid, name, category)
+            SELECT p."productID", p."productName", COALESCE(c."categoryName", '')
+            {_SOURCE}{where}
+        '''
+    else:
+        sql = f'''
+            INSERT INTO {POSTGRES_TABLE} (product_id, document)
+            SELECT p."productID",
+                   setweight(to_tsvector('simple', p."productName"), 'A') ||
+                   setweight(to_tsvector('simple', COALESCE(c."categoryName", '')), 'B')
+            {_SOURCE}{where}
+        '''
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def index_category(category_id, using=DEFAULT_DB_ALIAS):
+    """Reindex the products of a category, e.g. after it was renamed."""
+    index_products(
+        list(Product.objects.using(using).filter(categoryID=category_id).values_list('pk', flat=True)),
+        using,
+    )
+
+
+def remove_products(product_ids=None, using=DEFAULT_DB_ALIAS):
+    """Drop the given products (or all of them) from the index."""
+    kind = backend(using)
+    if kind is None or product_ids is not None and not product_ids:
+        return
+    if kind == 'sqlite':
+        where, params = _id_filter(product_ids, 'rowid')
+        table = SQLITE_TABLE
+    else:
+        where, params = _id_filter(product_ids, 'product_id')
+        table = POSTGRES_TABLE
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}{where}', params)
+
+
+def clear_index(using=DEFAULT_DB_ALIAS):
+    remove_products(None, using)
+
+
+def search_products(term, limit=SEARCH_LIMIT, using=DEFAULT_DB_ALIAS):
+    """
+    Ids of the products matching `term`, best match first (at most `limit`,
+    all of them if None), or None if this database has no search index.
+    """
+    kind = backend(using)
+    if kind is None:
+        return None
+    terms = _terms(term)
+    if not terms:
+        return []
+    if kind == 'sqlite':
+        # "cha"* "bev"*: every term, as a word prefix; name weighs 10x.
+        query = ' '.join(f'"{t}"*' for t in terms)
+        sql = f'''
+            SELECT rowid FROM {SQLITE_TABLE}
+            WHERE {SQLITE_TABLE} MATCH %s
+            ORDER BY bm25({SQLITE_TABLE}, 10.0, 1.0), rowid
+        '''
+    else:
+        query = ' & '.join(f'{t}:*' for t in terms)
+        sql = f'''
+            SELECT product_id FROM {POSTGRES_TABLE}, to_tsquery('simple', %s) query
+            WHERE document @@ query
+            ORDER BY ts_rank(document, query) DESC, product_id
+        '''
+    params = [query]
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ranked(queryset, product_ids):
+    """`queryset` restricted to `product_ids`, in that order."""
+    if not product_ids:
+        return queryset.none()
+    order = Case(*[When(pk=pk, then=Value(i)) for i, pk in enumerate(product_ids)],
+                 output_field=IntegerField())
+    return queryset.filter(pk__in=product_ids).order_by(order)
@@ -28,6 +28,7 @@ class OrderSerializer(serializers.ModelSerializer):
     employee_name = serializers.CharField(source='employeeID.employeeName', read_only=True)
     shipper_name = serializers.CharField(source='shipperID.companyName', read_only=True)
     order_details = OrderDetailSerializer(many=True, read_only=True)
+    total = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
     
     class Meta:
         model = Order
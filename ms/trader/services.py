@@ -0,0 +1,23 @@
+"""
+Write-side helpers that keep denormalized data in sync.
+"""
+from django.db import transaction
+from django.db.models.functions import Now
+
+from .caching import bump_generation
+from .models import Order, order_totals_expressions
+
+
+def refresh_order_totals(order_ids=None):
+    """
+    Recompute Order.subtotal, discount_total and line_count from the
+    order's detail rows in a single UPDATE ... SET col = (SELECT ...).
+
+    Pass the ids of the orders whose details changed, or None to rebuild
+    every order. Returns the number of orders updated.
+    """
+    orders = Order.objects.all() if order_ids is None else Order.objects.filter(pk__in=order_ids)
+    # update() skips auto_now, so set updated_at here.
+    updated = orders.update(**order_totals_expressions(prefix=''), updated_at=Now())
+    transaction.on_commit(lambda: bump_generation(Order))
+    return updated
@@ -0,0 +1,115 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import analytics, autocomplete, search
+from .caching import bump_generation
+from .models import Category, Customer, Employee, Order, OrderDetail, Product, Shipper
+from .services import refresh_order_totals
+
+# Models whose cached API responses are invalidated on every write.
+CACHED_MODELS = [Category, Customer, Employee, Shipper, Product, Order, OrderDetail]
+
+
+# What the deletion in progress in this thread (its `origin`: the instance
+# or queryset .delete() was called on) has done so far.
+_deletion = threading.local()
+
+
+def _deletion_state(origin):
+    if getattr(_deletion, 'origin', None) is not origin:
+        _deletion.origin = origin
+        _deletion.orders = set()     # orders it deletes
+        _deletion.refreshed = set()  # orders whose totals it refreshed
+    return _deletion
+
+
+def _mark_sales_day(detail):
+    if OrderDetail.orderID.is_cached(detail):
+        analytics.mark_days_changed([detail.orderID.orderDate])
+    else:
+        analytics.mark_orders_changed([detail.orderID_id])
+
+
+@receiver(post_save, sender=OrderDetail)
+def update_order_totals(sender, instance, **kwargs):
+    # Bulk writes (bulk_create, QuerySet.update) don't send these;
+    # callers of those refresh the totals themselves.
+    refresh_order_totals([instance.orderID_id])
+    _mark_sales_day(instance)
+
+
+@receiver(pre_delete, sender=Order)
+def mark_order_deleted(sender, instance, origin=None, **kwargs):
+    _deletion_state(origin).orders.add(instance.pk)
+
+
+@receiver(post_delete, sender=OrderDetail)
+def update_order_totals_after_delete(sender, instance, origin=None, **kwargs):
+    # Django deletes all the rows of a model before it sends post_delete
+    # for any of them, so by now every line this deletion removes is gone:
+    # one refresh per order is enough, and none for an order that is
+    # deleted along with its lines (Order or Customer.delete()).
+    state = _deletion_state(origin)
+    order_id = instance.orderID_id
+    if order_id in state.orders or order_id in state.refreshed:
+        return
+    state.refreshed.add(order_id)
+    refresh_order_totals([order_id])
+    _mark_sales_day(instance)
+
+
+@receiver(post_save, sender=Order)
+def mark_sales_days(sender, instance, **kwargs):
+    # Both days if the save moved the order to another one.
+    analytics.mark_days_changed([instance.orderDate, getattr(instance, '_loaded_order_date', None)])
+    instance._loaded_order_date = instance.orderDate
+
+
+@receiver(post_delete, sender=Order)
+def mark_sales_day_of_deleted(sender, instance, **kwargs):
+    analytics.mark_days_changed([instance.orderDate])
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created, **kwargs):
+    # The category name is part of each product's search document.
+    if not created:
+        search.index_category(instance.pk)
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    # Same caveat: bulk writes bump the generation themselves. Bumping
+    # before the commit would let a concurrent request cache the old rows
+    # under the new generation.
+    transaction.on_commit(lambda: bump_generation(sender))
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=model)
+    post_delete.connect(invalidate_cached_responses, sender=model)
+
+
+def update_autocomplete(sender, instance, **kwargs):
+    autocomplete.instance_saved(instance)
+
+
+def remove_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.instance_deleted(instance)
+
+
+for model in autocomplete.MODELS:
+    post_save.connect(update_autocomplete, sender=model)
+    post_delete.connect(remove_from_autocomplete, sender=model)
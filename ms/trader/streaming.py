@@ -0,0 +1,67 @@
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_CHUNK_SIZE = 500
+
+
+def iter_json_array(items, serialize=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Encode `items` as a JSON array, yielding one piece of bytes per chunk
+    of items so only a single chunk is ever held in memory.
+    """
+    encode = JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+    buffer = []
+    first = True
+    yield b'['
+    for item in items:
+        buffer.append(encode(serialize(item) if serialize else item))
+        if len(buffer) >= chunk_size:
+            yield (('' if first else ',') + ','.join(buffer)).encode()
+            first = False
+            buffer = []
+    if buffer:
+        yield (('' if first else ',') + ','.join(buffer)).encode()
+    yield b']'
+
+
+def streaming_json_response(items, serialize=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    StreamingHttpResponse that writes a JSON array element by element.
+
+    Pass a queryset's .iterator(chunk_size=...) as `items`: rows are then
+    fetched, serialized and sent one chunk at a time, so time-to-first-byte
+    and peak memory no longer grow with the size of the result.
+    """
+    return StreamingHttpResponse(
+        iter_json_array(items, serialize, chunk_size),
+        content_type='application/json',
+    )
+
+
+def wants_stream(request):
+    """`?stream` switches a list endpoint to the streaming response."""
+    return 'stream' in request.query_params
+
+
+class StreamingListMixin:
+    """
+    Adds a `?stream` mode to a ListAPIView.
+
+    The filtered queryset is walked with .iterator(chunk_size=...), which
+    still runs prefetch_related() once per chunk, and every object goes
+    through the view's serializer on its own. Pagination is skipped: the
+    whole result is streamed in the queryset's order.
+    """
+    stream_chunk_size = STREAM_CHUNK_SIZE
+
+    def list(self, request, *args, **kwargs):
+        if not wants_stream(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        serializer_class = self.get_serializer_class()
+        return streaming_json_response(
+            queryset.iterator(chunk_size=self.stream_chunk_size),
+            lambda obj: serializer_class(obj, context=context).data,
+            self.stream_chunk_size,
+        )
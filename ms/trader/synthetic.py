@@ -0,0 +1,204 @@
+"""
+Synthetic Northwind data for scale testing.
+
+The archive has 830 orders, which says little about how an endpoint
+behaves with millions. generate() writes an archive of any size, in the
+same CSV layout, so the importer (trader.importer) loads it the usual
+way: chunked, resumable, and in parallel with --workers.
+
+The data is skewed like real sales:
+
+- product popularity follows a Zipf distribution (a few products are in
+  most orders), and so does how often each customer orders;
+- customers order in bursts: with probability BURST_PROBABILITY an order
+  is followed by another one of the same customer, so runs of orders by
+  one customer land on the same or neighbouring days.
+
+Everything comes from one random.Random(seed), so the same arguments
+always write the same files. Rows are written as they are drawn; memory
+only grows with the number of customers and products, not of orders.
+"""
+import bisect
+import csv
+import itertools
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+
+from .importer import CSV_FILES
+
+ARCHIVE_DIR = settings.BASE_DIR / 'archive'
+
+# Zipf exponents: weight of the item of rank r is 1 / r ** s.
+PRODUCT_SKEW = 1.1
+CUSTOMER_SKEW = 0.9
+BURST_PROBABILITY = 0.3
+FIRST_ORDER_ID = 10248
+START_DATE = date(2013, 7, 4)
+# Orders are spread over three years however many there are.
+DEFAULT_DAYS = 3 * 365
+# (lines, weight): an order has 1-6 lines, about 2.6 on average like the archive's.
+LINES_PER_ORDER = [(1, 25), (2, 30), (3, 22), (4, 13), (5, 7), (6, 3)]
+DISCOUNTS = ['0'] * 6 + ['0.05', '0.1', '0.15', '0.2', '0.25']
+ADJECTIVES = [
+    'Organic', 'Classic', 'Premium', 'Smoked', 'Spiced', 'Golden', 'Wild',
+    'Royal', 'Rustic', 'Fresh', 'Aged', 'Sweet', 'Dark', 'Alpine', 'Nordic',
+]
+# Customer ids are at most five characters: "z" and 4 base-36 digits.
+MAX_CUSTOMERS = 36 ** 4
+
+
+def base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    text = ''
+    while True:
+        number, digit = divmod(number, 36)
+        text = digits[digit] + text
+        if not number:
+            return text
+
+
+def _read(data_dir, table):
+    with open(Path(data_dir) / CSV_FILES[table], newline='', encoding='utf-8') as source:
+        reader = csv.DictReader(source)
+        return reader.fieldnames, list(reader)
+
+
+def zipf_weights(count, skew, rng):
+    """Cumulative Zipf weights for `count` items, in a random order of ranks."""
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return list(itertools.accumulate(1 / rank ** skew for rank in ranks))
+
+
+class _Picker:
+    """Draws indexes 0..n-1 with the given cumulative weights."""
+
+    def __init__(self, cum_weights, rng):
+        self.cum_weights = cum_weights
+        self.total = cum_weights[-1]
+        self.random = rng.random
+
+    def __call__(self):
+        return bisect.bisect(self.cum_weights, self.random() * self.total)
+
+
+def generate(directory, orders, seed=0, customers=None, products=None, days=DEFAULT_DAYS,
+             data_dir=ARCHIVE_DIR):
+    """
+    Write a Northwind archive with `orders` orders to `directory`.
+
+    The archive's categories, employees and shippers are kept as they are,
+    and so are its customers and products, which come first. More are made
+    up up to `customers` (default: one per 10 orders) and `products`
+    (default: one per 100 orders), if that is more than the archive has.
+    Orders start at FIRST_ORDER_ID on START_DATE and are spread evenly
+    over `days`. Returns the number of rows written per table.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    counts = {}
+
+    for table in ('categories', 'employees', 'shippers'):
+        fieldnames, rows = _read(data_dir, table)
+        counts[table] = _write(directory, table, fieldnames, (list(row.values()) for row in rows))
+    employee_ids = [row['employeeID'] for row in _read(data_dir, 'employees')[1]]
+    shipper_ids = [row['shipperID'] for row in _read(data_dir, 'shippers')[1]]
+
+    fieldnames, archive_customers = _read(data_dir, 'customers')
+    customers = customers or max(orders // 10, len(archive_customers))
+    if customers > MAX_CUSTOMERS:
+        raise ValueError(f"At most {MAX_CUSTOMERS} customers fit in a customer id.")
+    customer_rows = [list(row.values()) for row in archive_customers[:customers]]
+    for i in range(len(customer_rows), customers):
+        base = rng.choice(archive_customers)
+        customer_rows.append([
+            'z' + base36(i), f"{base['companyName']} {base36(i).upper()}", base['contactName'],
+            base['contactTitle'], base['city'], base['country'],
+        ])
+    counts['customers'] = _write(directory, 'customers', fieldnames, customer_rows)
+    customer_ids = [row[0] for row in customer_rows]
+    del customer_rows
+
+    fieldnames, archive_products = _read(data_dir, 'products')
+    products = products or max(orders // 100, len(archive_products))
+    product_rows = [list(row.values()) for row in archive_products[:products]]
+    next_id = max(int(row['productID']) for row in archive_products) + 1
+    while len(product_rows) < products:
+        base = rng.choice(archive_products)
+        price = (Decimal(base['unitPrice']) * Decimal(rng.uniform(0.5, 2))).quantize(Decimal('0.01'))
+        product_rows.append([
+            str(next_id), f"{rng.choice(ADJECTIVES)} {base['productName']} {next_id}",
+            base['quantityPerUnit'], str(price), '1' if rng.random() < 0.1 else '0', base['categoryID'],
+        ])
+        next_id += 1
+    counts['products'] = _write(directory, 'products', fieldnames, product_rows)
+    product_prices = [(row[0], row[3]) for row in product_rows]
+    del product_rows
+
+    pick_product = _Picker(zipf_weights(len(product_prices), PRODUCT_SKEW, rng), rng)
+    pick_customer = _Picker(zipf_weights(len(customer_ids), CUSTOMER_SKEW, rng), rng)
+    line_counts, line_weights = zip(*LINES_PER_ORDER)
+    line_weights = list(itertools.accumulate(line_weights))
+    last_day = days - 1
+
+    def order_rows(detail_writer):
+        customer = None
+        for i in range(orders):
+            order_id = FIRST_ORDER_ID + i
+            day = i * days // orders
+            if customer is None or rng.random() >= BURST_PROBABILITY:
+                customer = pick_customer()
+            ordered = START_DATE + timedelta(days=day)
+            shipped = day + rng.randint(1, 14)
+            yield [
+                order_id, customer_ids[customer], rng.choice(employee_ids), ordered.isoformat(),
+                (ordered + timedelta(days=28)).isoformat(),
+                # the most recent orders haven't shipped yet
+                (START_DATE + timedelta(days=shipped)).isoformat() if shipped <= last_day else '',
+                rng.choice(shipper_ids), f"{rng.uniform(0, 250):.2f}",
+            ]
+            lines = rng.choices(line_counts, cum_weights=line_weights)[0]
+            chosen = set()
+            # A few extra draws, then give up: tiny catalogs may not have
+            # that many distinct products.
+            for _ in range(lines * 3):
+                chosen.add(pick_product())
+                if len(chosen) == lines:
+                    break
+            for product in sorted(chosen):
+                product_id, price = product_prices[product]
+                detail_writer.writerow([
+                    order_id, product_id, price,
+                    # Mostly small quantities, some large ones
+                    min(int(rng.expovariate(1 / 20)) + 1, 130), rng.choice(DISCOUNTS),
+                ])
+                counts['order_details'] += 1
+
+    counts['order_details'] = 0
+    order_fields = _read_header(data_dir, 'orders')
+    with open(directory / CSV_FILES['order_details'], 'w', newline='', encoding='utf-8') as details:
+        detail_writer = csv.writer(details)
+        detail_writer.writerow(_read_header(data_dir, 'order_details'))
+        counts['orders'] = _write(directory, 'orders', order_fields, order_rows(detail_writer))
+    return {table: counts[table] for table in CSV_FILES}
+
+
+def _read_header(data_dir, table):
+    with open(Path(data_dir) / CSV_FILES[table], newline='', encoding='utf-8') as source:
+        return next(csv.reader(source))
+
+
+def _write(directory, table, fieldnames, rows):
+    count = 0
+    with open(directory / CSV_FILES[table], 'w', newline='', encoding='utf-8') as target:
+        writer = csv.writer(target)
+        writer.writerow(fieldnames)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
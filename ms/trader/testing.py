@@ -0,0 +1,107 @@
+"""
+Helpers for tests that load Northwind data.
+"""
+import csv
+from pathlib import Path
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from .importer import CSV_FILES, import_all, truncate_tables
+
+ARCHIVE_DIR = settings.BASE_DIR / 'archive'
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Silk writes its own rows for every request, which would show up in
+# assertNumQueries; tests that count queries run without the profilers.
+# Our own sampling middleware stays installed but samples nothing, so the
+# N+1 detector doesn't log at random; tests of it set the rates (above
+# this decorator, or it would reset them).
+without_profilers = override_settings(
+    MIDDLEWARE=[
+        name for name in settings.MIDDLEWARE
+        if not name.startswith(('silk.', 'debug_toolbar.'))
+    ],
+    NPLUSONE_SAMPLE_RATE=0,
+    PROFILER_SAMPLE_RATE=0,
+)
+
+
+class TestRunner(DiscoverRunner):
+    """
+    The default runner, with a LocMemCache instead of the file cache of the
+    settings: cached responses there outlive the test database, and a test
+    could be served the rows of an earlier run.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES=LOCMEM)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+def load_northwind(data_dir=ARCHIVE_DIR, **options):
+    """Import the CSV archive (or another extract) into the test database."""
+    return import_all(data_dir, **options)
+
+
+def write_extract(directory, rows, data_dir=ARCHIVE_DIR):
+    """
+    Write a small but consistent Northwind archive to `directory`: the
+    lookup tables in full, the first `rows` orders with all their details,
+    and the first `rows` products plus those the details refer to.
+    """
+    directory = Path(directory)
+    tables = {}
+    for table, filename in CSV_FILES.items():
+        with open(data_dir / filename, newline='', encoding='utf-8') as source:
+            reader = csv.DictReader(source)
+            tables[table] = (reader.fieldnames, list(reader))
+
+    orders = tables['orders'][1][:rows]
+    order_ids = {order['orderID'] for order in orders}
+    details = [d for d in tables['order_details'][1] if d['orderID'] in order_ids]
+    product_ids = {d['productID'] for d in details}
+    products = [p for i, p in enumerate(tables['products'][1]) if i < rows or p['productID'] in product_ids]
+    extract = {'orders': orders, 'order_details': details, 'products': products}
+
+    for table, filename in CSV_FILES.items():
+        fieldnames, records = tables[table]
+        with open(directory / filename, 'w', newline='', encoding='utf-8') as target:
+            writer = csv.DictWriter(target, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(extract.get(table, records))
+
+
+def full_scans(plan):
+    """The steps of an EXPLAIN plan (see trader.instrumentation) that read a whole table."""
+    return [step for step in plan if _is_full_scan(step.strip())]
+
+
+def _is_full_scan(step):
+    if step.startswith('Seq Scan'):
+        # PostgreSQL
+        return True
+    # SQLite: "SCAN t" reads every row, "SCAN t USING [COVERING] INDEX i"
+    # walks an index in order, and virtual tables (FTS5) do their own lookup.
+    return (step.startswith('SCAN ') and ' USING ' not in step
+            and 'VIRTUAL TABLE' not in step and step != 'SCAN CONSTANT ROW')
+
+
+class FastTruncateMixin:
+    """
+    Empty the Northwind tables before every test with truncate_tables().
+
+    Meant for TransactionTestCase/LiveServerTestCase subclasses that load
+    large extracts: the raw DELETE/TRUNCATE skips the ORM cascade collector
+    and also resets the id sequences, so generated ids start at 1 again.
+    """
+
+    def setUp(self):
+        truncate_tables()
+        super().setUp()
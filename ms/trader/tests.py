@@ -1,3 +1,883 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import Count, F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from . import autocomplete, urls
+from .instrumentation import capture_queries, explain, fingerprint, is_select
+from .management.commands.benchmark import write_scaled
+from .importer import CSV_FILES, Checkpoint, import_all, import_table, truncate_tables
+from .analytics import REPORTS, live_revenue, refresh_rollup, rollup_revenue
+from .caching import bump_generation, get_generations
+from .conditional import ConditionalGetMixin
+from .models import Category, Customer, DailySales, Employee, Order, OrderDetail, Product
+from .parallel import shard_ranges
+from .profiling import StackSampler, sampler
+from .search import search_products
+from .synthetic import generate
+from .serializers import ProductLightSerializer
+from .testing import ARCHIVE_DIR, full_scans, load_northwind, without_profilers, write_extract
+
+
+class BulkImportTests(TestCase):
+
+    def test_imports_archive(self):
+        stats = {s['table']: s for s in import_all(ARCHIVE_DIR)}
+
+        self.assertEqual(Order.objects.count(), 830)
+        self.assertEqual(OrderDetail.objects.count(), 2155)
+        self.assertEqual(stats['order_details']['written'], 2155)
+        # reportsTo refers to a manager further down the same file
+        self.assertEqual(Employee.objects.get(pk=1).reportsTo_id, 8)
+
+    def test_reimport_is_idempotent(self):
+        import_all(ARCHIVE_DIR)
+        import_all(ARCHIVE_DIR)
+
+        self.assertEqual(OrderDetail.objects.count(), 2155)
+
+    def test_query_count_does_not_scale_with_rows(self):
+        import_table('categories', ARCHIVE_DIR / 'categories.csv')
+
+        # one key-set lookup, SAVEPOINT, a single INSERT, the search index
+        # DELETE + INSERT ... SELECT, RELEASE
+        with self.assertNumQueries(6):
+            import_table('products', ARCHIVE_DIR / 'products.csv', batch_size=1000)
+
+    def test_resumes_after_last_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for table in ['categories', 'customers', 'employees', 'shippers', 'products', 'orders']:
+                import_table(table, ARCHIVE_DIR / f'{table}.csv')
+            checkpoint = Checkpoint(directory)
+            checkpoint.save('order_details', 2000)
+
+            stats = import_table('order_details', ARCHIVE_DIR / 'order_details.csv',
+                                 chunk_size=100, checkpoint=checkpoint, resume=True)
+
+            self.assertEqual(stats['resumed_from'], 2000)
+            self.assertEqual(OrderDetail.objects.count(), 155)
+            self.assertEqual(checkpoint.get('order_details'), {'rows': 2155, 'done': True})
+
+    def test_shards_cover_every_order_detail_once(self):
+        for table in ['categories', 'customers', 'employees', 'shippers', 'products', 'orders']:
+            import_table(table, ARCHIVE_DIR / f'{table}.csv')
+        shards = shard_ranges(10248, 11077, 3)
+
+        written = sum(
+            import_table('order_details', ARCHIVE_DIR / 'order_details.csv', key_range=key_range)['written']
+            for key_range in shards
+        )
+
+        self.assertEqual(shards[0][0], None)
+        self.assertEqual(shards[-1][1], None)
+        self.assertEqual(written, 2155)
+        self.assertEqual(OrderDetail.objects.count(), 2155)
+
+    def test_truncate_empties_tables_and_resets_sequences(self):
+        load_northwind()
+
+        with self.assertNumQueries(14):
+            # SAVEPOINT, one DELETE per table, one sqlite_sequence reset,
+            # RELEASE, then the search index
+            truncate_tables()
+
+        self.assertFalse(OrderDetail.objects.exists())
+        self.assertFalse(Category.objects.exists())
+        self.assertEqual(Category.objects.create(categoryName='New').pk, 1)
+
+
+class ImportCommandTests(TestCase):
+
+    def run_command(self, *args):
+        stdout = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('import_northwind', '--checkpoint-dir', directory, *args,
+                         stdout=stdout, stderr=io.StringIO())
+        return json.loads(stdout.getvalue())
+
+    def test_summary_reports_every_table(self):
+        summary = self.run_command()
+
+        self.assertEqual([t['table'] for t in summary['tables']][-1], 'order_details')
+        self.assertEqual(summary['written'], 3173)
+        for table in summary['tables']:
+            self.assertIn('queries', table)
+            self.assertIn('rows_per_sec', table)
+
+    def test_dry_run_rolls_back(self):
+        summary = self.run_command('--dry-run')
+
+        self.assertEqual(summary['written'], 3173)
+        self.assertFalse(Order.objects.exists())
+
+
+@without_profilers
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def walk(self, url, direction='next'):
+        pages = []
+        while url:
+            with self.assertNumQueries(3):
+                # orders page + prefetched details + their products; no COUNT
+                response = self.client.get(url)
+            pages.append([o['orderID'] for o in response.data['results']])
+            url = response.data[direction]
+        return pages
+
+    def test_walks_every_order_once_in_order(self):
+        pages = self.walk(reverse('orders-optimized') + '?page_size=100')
+
+        ids = [order_id for page in pages for order_id in page]
+        expected = list(Order.objects.order_by('-orderDate', '-orderID').values_list('pk', flat=True))
+        self.assertEqual(len(pages), 9)
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_to_earlier_page(self):
+        first = self.client.get(reverse('orders-optimized') + '?page_size=20').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+
+        self.assertIsNone(first['previous'])
+        self.assertEqual([o['orderID'] for o in back['results']],
+                         [o['orderID'] for o in first['results']])
+
+    def test_bad_cursor_is_404(self):
+        response = self.client.get(reverse('orders-optimized') + '?cursor=not-a-cursor')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_customer_filter(self):
+        pages = self.walk(reverse('orders-optimized') + '?customer=ALFKI&page_size=4')
+
+        expected = list(Order.objects.filter(customerID='ALFKI').values_list('pk', flat=True))
+        self.assertEqual([order_id for page in pages for order_id in page], expected)
+
+
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        return '\n'.join(explain(sql, params))
+
+    def test_indexes_match_query_patterns(self):
+        self.assertIn('order_customer_date_idx', self.plan(Order.objects.filter(customerID='ALFKI')))
+        self.assertIn('detail_product_order_idx', self.plan(OrderDetail.objects.filter(productID=11)))
+        self.assertIn('product_name_idx', self.plan(Product.objects.filter(productName='Chai')))
+        self.assertIn('product_active_idx', self.plan(
+            Product.objects.filter(discontinued=False, categoryID=1).order_by('productName')
+        ))
+
+    def test_explain_command_shows_before_and_after(self):
+        stdout = io.StringIO()
+        call_command('explain', '--endpoint', 'orders-optimized', '--endpoint', 'test-indexed-search',
+                     '--no-color', stdout=stdout)
+        output = stdout.getvalue()
+
+        self.assertIn('GET /api/2-orders-optimized/?customer=ALFKI  (3 queries, 3 distinct)', output)
+        self.assertIn('before: SCAN trader_product', output)
+        self.assertIn('after:  SEARCH trader_product USING INDEX product_name_idx', output)
+        # the old schema was rolled back
+        self.assertIn('product_name_idx', self.plan(Product.objects.filter(productName='Chai')))
+
+
+# (url name, method, url kwargs, query string, query budget, indexed)
+# The budget must hold on the full archive and the count must be the same
+# on a 10-order, 10-product extract: a query per row shows up as a
+# difference. On `indexed` endpoints no SELECT may scan a whole table.
+ENDPOINT_BUDGETS = [
+    ('orders-optimized', 'get', {}, {}, 3, True),
+    ('orders-optimized', 'get', {}, {'customer': 'VINET'}, 3, True),
+    ('product-search-q', 'get', {}, {'search': 'cha'}, 2, True),
+    # SELECT, UPDATE, then DELETE + INSERT in the search index
+    ('product-increase-price', 'post', {'pk': 1}, {}, 4, True),
+    ('products-only', 'get', {}, {}, 1, False),
+    ('categories-defer', 'get', {}, {}, 1, False),
+    ('products-as-dict', 'get', {}, {}, 1, False),
+    ('products-as-tuple', 'get', {}, {}, 1, False),
+    ('test-indexed-search', 'get', {}, {'term': 'Chai'}, 2, True),
+    ('test-non-indexed-search', 'get', {}, {}, 2, False),
+    # cold index: one prefix query per kind
+    ('autocomplete', 'get', {}, {'q': 'cha'}, 3, False),
+    ('sales-revenue', 'get', {'report': 'product'}, {}, 1, True),
+    ('sales-revenue', 'get', {'report': 'product'}, {'source': 'live'}, 1, False),
+]
+# Deliberately slow demo endpoints: the suite must flag them.
+KNOWN_N_PLUS_ONE = [
+    ('orders-unoptimized', 'get', {}, {}),
+]
+
+
+@without_profilers
+@override_settings(AUTOCOMPLETE_AUTOLOAD=False)
+class EndpointQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def queries(self, name, method, kwargs, query):
+        """The statements one request runs, with every cache cold."""
+        cache.clear()
+        autocomplete.reset()
+        with capture_queries() as queries:
+            response = getattr(self.client, method)(reverse(name, kwargs=kwargs), query)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {name}")
+        return queries
+
+    def measure_all(self, endpoints):
+        return [len(self.queries(*endpoint[:4])) for endpoint in endpoints]
+
+    def shrink_to_extract(self):
+        truncate_tables()
+        with tempfile.TemporaryDirectory() as directory:
+            write_extract(directory, rows=10)
+            load_northwind(directory)
+
+    def test_every_endpoint_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        covered = {endpoint[0] for endpoint in ENDPOINT_BUDGETS + KNOWN_N_PLUS_ONE}
+        self.assertEqual(names - covered, set())
+
+    def test_query_counts_are_within_budget_and_flat(self):
+        full = self.measure_all(ENDPOINT_BUDGETS)
+        self.shrink_to_extract()
+        small = self.measure_all(ENDPOINT_BUDGETS)
+
+        for endpoint, at_full, at_small in zip(ENDPOINT_BUDGETS, full, small):
+            name, _, _, query, budget, _ = endpoint
+            with self.subTest(endpoint=name, query=query):
+                self.assertLessEqual(at_full, budget)
+                self.assertEqual(at_full, at_small, "query count grows with the number of rows")
+
+    def test_known_n_plus_one_is_caught(self):
+        full = self.measure_all(KNOWN_N_PLUS_ONE)
+        self.shrink_to_extract()
+        small = self.measure_all(KNOWN_N_PLUS_ONE)
+
+        for endpoint, at_full, at_small in zip(KNOWN_N_PLUS_ONE, full, small):
+            with self.subTest(endpoint=endpoint[0]):
+                self.assertGreater(at_full, at_small)
+
+    def test_indexed_endpoints_do_not_scan_tables(self):
+        for name, method, kwargs, query, _, indexed in ENDPOINT_BUDGETS:
+            if not indexed:
+                continue
+            for captured in self.queries(name, method, kwargs, query):
+                if not is_select(captured.sql):
+                    continue
+                with self.subTest(endpoint=name, query=query, sql=captured.sql[:80]):
+                    self.assertEqual(full_scans(explain(captured.sql, captured.params)), [])
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_scaled_copies_reference_their_own_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_scaled(directory, 3)
+            load_northwind(directory)
+
+        self.assertEqual(Order.objects.count(), 3 * 830)
+        self.assertEqual(OrderDetail.objects.count(), 3 * 2155)
+        self.assertEqual(Customer.objects.count(), 3 * 91)
+        copy = Order.objects.get(pk=10248 + 2 * 11077)
+        self.assertTrue(copy.customerID_id.startswith('z'))
+        self.assertEqual(copy.order_details.count(), Order.objects.get(pk=10248).order_details.count())
+
+    def test_reports_and_compares_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/results.json'
+            call_command('benchmark', '--scale', '1', '--strategy', 'per-row', '--strategy', 'select_related',
+                         '--iterations', '2', '--warmup', '0', '--json', path, stdout=io.StringIO())
+            with open(path) as f:
+                report = json.load(f)
+
+            self.assertEqual(list(report['results']), ['1x/per-row', '1x/select_related'])
+            self.assertEqual(report['results']['1x/select_related']['queries'], 3)
+            self.assertGreater(report['results']['1x/per-row']['queries'], 3)
+            self.assertEqual(report['meta']['rows']['1x']['Order'], 830)
+            # the data was rolled back
+            self.assertEqual(Order.objects.count(), 0)
+
+            report['results']['1x/select_related']['queries'] = 2
+            with open(path, 'w') as f:
+                json.dump(report, f)
+            with self.assertRaisesMessage(CommandError, '1x/select_related: 2 -> 3 queries'):
+                call_command('benchmark', '--scale', '1', '--strategy', 'select_related',
+                             '--iterations', '2', '--warmup', '0', '--compare', path, stdout=io.StringIO())
+
+
+class SyntheticDataTests(TestCase):
+
+    def generate(self, directory, seed=0):
+        return generate(directory, 3000, seed=seed, customers=200, products=150)
+
+    def read(self, directory, table):
+        with open(f'{directory}/{CSV_FILES[table]}', newline='') as f:
+            return f.read()
+
+    def test_same_seed_same_files(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            self.generate(first)
+            self.generate(second)
+            same = [self.read(first, table) == self.read(second, table) for table in CSV_FILES]
+            self.generate(second, seed=1)
+            other_seed = self.read(first, 'order_details') == self.read(second, 'order_details')
+
+        self.assertEqual(same, [True] * len(CSV_FILES))
+        self.assertFalse(other_seed)
+
+    def test_importer_loads_every_row(self):
+        with tempfile.TemporaryDirectory() as directory:
+            rows = self.generate(directory)
+            load_northwind(directory)
+
+        self.assertEqual(rows['orders'], 3000)
+        self.assertEqual(Order.objects.count(), 3000)
+        self.assertEqual(OrderDetail.objects.count(), rows['order_details'])
+        self.assertEqual(Customer.objects.count(), 200)
+        self.assertEqual(Product.objects.count(), 150)
+        # the archive's own products come first
+        self.assertTrue(Product.objects.filter(pk=1, productName='Chai').exists())
+
+    def test_popularity_is_skewed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.generate(directory)
+            load_northwind(directory)
+
+        lines = sorted(Product.objects.annotate(lines=Count('order_details')).values_list('lines', flat=True))
+        self.assertGreater(lines[-1], 10 * lines[len(lines) // 2])
+        customers = list(Order.objects.order_by('pk').values_list('customerID', flat=True))
+        repeats = sum(a == b for a, b in zip(customers, customers[1:]))
+        # with 200 customers, a random next order would repeat ~1% of the time
+        self.assertGreater(repeats, len(customers) * 0.2)
+
+
+@override_settings(NPLUSONE_SAMPLE_RATE=1.0, NPLUSONE_THRESHOLD=10)
+@without_profilers
+class NPlusOneMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 1 AND name = 'it''s'"),
+            fingerprint("SELECT *\n  FROM t WHERE id = 22 AND name = 'x'"),
+        )
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+                         'SELECT * FROM t WHERE id IN (...)')
+        self.assertNotEqual(fingerprint('SELECT a FROM t'), fingerprint('SELECT b FROM t'))
+
+    def test_logs_repeated_statement_with_its_caller(self):
+        with self.assertLogs('trader.middleware', 'WARNING') as logs:
+            self.client.get(reverse('orders-unoptimized'))
+
+        self.assertTrue(any('FROM "trader_customer"' in line for line in logs.output), logs.output)
+        # the DRF field that followed the relation, one query per order
+        self.assertIn('rest_framework/', logs.output[0])
+        self.assertIn('GET /api/1-orders-unoptimized/', logs.output[0])
+
+    def test_optimized_view_is_not_flagged(self):
+        with self.assertNoLogs('trader.middleware', 'WARNING'):
+            self.client.get(reverse('orders-optimized'))
+
+    @override_settings(NPLUSONE_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_watched(self):
+        with self.assertNoLogs('trader.middleware', 'WARNING'):
+            self.client.get(reverse('orders-unoptimized'))
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class StackSamplerTests(TestCase):
+
+    def test_samples_collapse_under_route(self):
+        profiler = StackSampler()
+        profiler.start(sys._getframe())
+        spin(0.1)
+        profiler.stop('api/spin/')
+
+        lines = profiler.collapsed().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertEqual(stack, 'api/spin/;trader.tests:spin')
+        self.assertGreater(int(count), 1)
+        self.assertEqual(profiler.summary(), {'api/spin/': (1, sum(int(l.rsplit(' ', 1)[1]) for l in lines))})
+        self.assertEqual(profiler.collapsed(route='api/other/'), '')
+
+
+@override_settings(PROFILER_SAMPLE_RATE=1.0, PROFILER_INTERVAL=0.001)
+@without_profilers
+class SamplingProfilerMiddlewareTests(TestCase):
+
+    def setUp(self):
+        sampler.reset()
+        self.addCleanup(sampler.reset)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+
+    def test_profiles_requests_per_url_pattern(self):
+        self.client.get(reverse('sales-revenue', kwargs={'report': 'product'}))
+        self.client.get(reverse('sales-revenue', kwargs={'report': 'category'}))
+
+        self.assertEqual(sampler.summary()['api/analytics/revenue/<str:report>/'][0], 2)
+
+    @override_settings(PROFILER_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_unless_asked(self):
+        self.client.get(reverse('products-only'))
+        self.assertEqual(sampler.summary(), {})
+
+        self.client.get(reverse('products-only'), {'profile': ''})
+        self.assertEqual(list(sampler.summary()), ['api/5-products-only/'])
+
+    def test_download_is_staff_only(self):
+        url = reverse('sampled-profile')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('profile.folded', response['Content-Disposition'])
+
+    def test_reset(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('products-only'))
+        self.assertTrue(self.client.get(reverse('sampled-profile'), {'summary': ''}).json())
+
+        self.assertEqual(self.client.post(reverse('sampled-profile')).status_code, 204)
+        # only the POST itself, profiled after the reset
+        self.assertEqual(list(sampler.summary()), ['admin/profile/'])
+
+    def test_download_adds_up_every_process(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # What another worker process flushed
+        with open(f'{directory}/1.json', 'w') as f:
+            json.dump({'profiles': {'api/5-products-only/': {'a;b': 7}},
+                       'requests': {'api/5-products-only/': 2}}, f)
+        self.client.force_login(self.admin)
+
+        with override_settings(PROFILER_DIR=directory, PROFILER_FLUSH_INTERVAL=0):
+            self.client.get(reverse('products-only'))
+            summary = self.client.get(reverse('sampled-profile'), {'summary': ''}).json()
+            self.assertEqual(summary['api/5-products-only/']['requests'], 3)
+            self.assertGreaterEqual(summary['api/5-products-only/']['samples'], 7)
+            self.assertIn('api/5-products-only/;a;b 7\n', self.client.get(reverse('sampled-profile')).content.decode())
+
+            self.client.post(reverse('sampled-profile'))
+            # the POST itself was flushed after the files were removed
+            self.assertEqual(list(self.client.get(reverse('sampled-profile'), {'summary': ''}).json()),
+                             ['admin/profile/'])
+        self.assertFalse(os.path.exists(f'{directory}/1.json'))
+
+
+@without_profilers
+class ResponseCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse('orders-optimized') + '?page_size=20'
+        first = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get(reverse('product-search-q'), {'search': 'ch', 'x': '1'})
+
+        self.assertEqual(self.client.get(reverse('product-search-q') + '?x=1&search=ch')['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(reverse('product-search-q'), {'search': 'tofu'})['X-Cache'], 'MISS')
+
+    def test_save_invalidates(self):
+        url = reverse('categories-defer')
+        self.client.get(url)
+        category = Category.objects.get(pk=1)
+        category.categoryName = 'Drinks'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+            # Not committed yet: other requests still see the old row, so
+            # they must keep using the old generation.
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()[0]['categoryName'], 'Drinks')
+
+    def test_related_model_write_invalidates(self):
+        url = reverse('orders-optimized') + '?page_size=5'
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderDetail.objects.filter(orderID=11077).first().delete()
+
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        # a model the view doesn't read leaves it alone
+        bump_generation(Category)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_bulk_writes_bump_generations(self):
+        before = get_generations([Product, Order])
+        with self.captureOnCommitCallbacks(execute=True):
+            truncate_tables()
+        after_truncate = get_generations([Product, Order])
+        with self.captureOnCommitCallbacks(execute=True):
+            import_table('categories', ARCHIVE_DIR / 'categories.csv')
+            import_table('products', ARCHIVE_DIR / 'products.csv')
+
+        self.assertTrue(all(a > b for a, b in zip(after_truncate, before)))
+        self.assertGreater(get_generations([Product])[0], after_truncate[0])
+
+    def test_streaming_is_not_cached(self):
+        url = reverse('orders-optimized') + '?stream'
+        b''.join(self.client.get(url).streaming_content)
+
+        self.assertTrue(self.client.get(url).streaming)
+
+
+@without_profilers
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def test_prefix_terms_rank_name_matches_first(self):
+        ranked = search_products('meat')
+
+        # "Boston Crab Meat", then everything in "Meat & Poultry"
+        self.assertEqual(ranked[0], 40)
+        self.assertEqual(sorted(ranked[1:]), sorted(Product.objects.filter(categoryID=6).values_list('pk', flat=True)))
+        self.assertIn(1, search_products('cha'))
+        self.assertEqual(search_products('chai bev'), [1])
+
+    def test_index_follows_writes(self):
+        product = Product.objects.get(pk=1)
+        product.productName = 'Masala Tea'
+        product.save()
+        self.assertEqual(search_products('masala'), [1])
+        self.assertNotIn(1, search_products('chai'))
+
+        category = product.categoryID
+        category.categoryName = 'Infusions'
+        category.save()
+        self.assertIn(1, search_products('infus'))
+
+        OrderDetail.objects.filter(productID=product).delete()
+        product.delete()
+        self.assertEqual(search_products('masala'), [])
+
+    def test_endpoint_keeps_its_shape(self):
+        response = self.client.get(reverse('product-search-q'), {'search': 'Beverages'})
+
+        self.assertEqual(len(response.json()), 12)
+        self.assertEqual(response.json()[0]['category_name'], 'Beverages')
+
+    def test_benchmark_command(self):
+        stdout = io.StringIO()
+        call_command('benchmark_search', '--products', '300', '--queries', '5', stdout=stdout)
+
+        summary = json.loads(stdout.getvalue())
+        self.assertEqual(summary['products'], 377)
+        self.assertEqual(Product.objects.count(), 77)
+
+
+@without_profilers
+@override_settings(AUTOCOMPLETE_AUTOLOAD=False)
+class AutocompleteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def setUp(self):
+        autocomplete.load()
+        self.addCleanup(autocomplete.reset)
+
+    def names(self, term, **params):
+        response = self.client.get(reverse('autocomplete'), {'q': term, **params})
+        self.assertEqual(response.json()['source'], 'index')
+        return [result['name'] for result in response.json()['results']]
+
+    def test_name_then_word_then_infix_matches(self):
+        self.assertEqual(self.names('con'), [
+            'Condiments', 'Confections', 'Consolidated Holdings',  # name prefix
+            'Eastern Connection',                                  # word prefix
+            "Sir Rodney's Scones",                                 # inside a word
+        ])
+        self.assertEqual(self.names('crab m'), ['Boston Crab Meat'])
+        self.assertEqual(self.names('cha', type='product', limit=2), ['Chai', 'Chang'])
+
+    def test_answers_without_queries(self):
+        with self.assertNumQueries(0):
+            self.names('al')
+
+    def test_follows_committed_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=1)
+            product.productName = 'Masala Chai'
+            product.save()
+            Customer.objects.create(customerID='ZZZZZ', companyName='Zebra Traders',
+                                    contactName='Z', city='Oslo', country='Norway')
+        self.assertEqual(self.names('masala'), ['Masala Chai'])
+        self.assertEqual(self.names('zebra'), ['Zebra Traders'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.get(pk='ZZZZZ').delete()
+        self.assertEqual(self.names('zebra'), [])
+
+    def test_bulk_writes_mark_the_index_stale(self):
+        self.assertEqual(autocomplete._current_generations(), autocomplete._state.generations)
+        with self.captureOnCommitCallbacks(execute=True):
+            truncate_tables()
+        self.assertNotEqual(autocomplete._current_generations(), autocomplete._state.generations)
+
+    def test_writes_of_other_processes_reload_the_index(self):
+        # All an import in another process leaves behind: a newer counter
+        # in the shared cache, and no signal in this one.
+        bump_generation(Product)
+        autocomplete._state.checked_at = 0.0
+        with override_settings(AUTOCOMPLETE_AUTOLOAD=True), \
+                mock.patch.object(autocomplete, 'start_loading') as start_loading:
+            self.names('chai')
+        start_loading.assert_called_once_with()
+
+    def test_cold_index_falls_back_to_database(self):
+        autocomplete.reset()
+        response = self.client.get(reverse('autocomplete'), {'q': 'boston'})
+
+        self.assertEqual(response.json()['source'], 'database')
+        self.assertEqual([r['name'] for r in response.json()['results']], ['Boston Crab Meat'])
+
+    def test_unknown_type_is_400(self):
+        response = self.client.get(reverse('autocomplete'), {'q': 'a', 'type': 'supplier'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductsByUpdate(ConditionalGetMixin, generics.ListAPIView):
+    # no cache_models: validated with Max(updated_at) and Count()
+    serializer_class = ProductLightSerializer
+    queryset = Product.objects.all()
+
+
+@without_profilers
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matching_etag_is_304_without_queries(self):
+        url = reverse('orders-optimized') + '?page_size=10'
+        response = self.client.get(url)
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+    def test_every_page_has_its_own_etag(self):
+        first = self.client.get(reverse('orders-optimized') + '?page_size=10')
+        second = self.client.get(first.json()['next'])
+
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_write_changes_etag(self):
+        url = reverse('products-only')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=1).save()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_updated_at_validator(self):
+        view = ProductsByUpdate.as_view()
+        factory = APIRequestFactory()
+        etag = view(factory.get('/products/')).render()['ETag']
+
+        with self.assertNumQueries(1):
+            response = view(factory.get('/products/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+
+        Product.objects.filter(pk=77).delete()
+        self.assertEqual(view(factory.get('/products/', HTTP_IF_NONE_MATCH=etag)).status_code, 200)
+
+
+@without_profilers
+class StreamingResponseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def test_streams_full_order_history(self):
+        response = self.client.get(reverse('orders-optimized') + '?stream')
+
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(5):
+            # one orders cursor, then details and products per 500-order chunk
+            data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data), 830)
+        self.assertEqual(data[0], self.client.get(reverse('orders-optimized')).json()['results'][0])
+
+    def test_streams_values_list(self):
+        response = self.client.get(reverse('products-as-tuple') + '?stream')
+
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data), 77)
+        self.assertEqual(data[0], [1, 'Chai', 18.0])
+
+
+class OrderTotalsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+
+    def test_import_fills_totals(self):
+        order = Order.objects.get(pk=10250)
+        details = list(order.order_details.all())
+
+        self.assertEqual(order.line_count, len(details))
+        self.assertEqual(order.total, sum(d.total_price for d in details))
+
+    def test_stored_totals_match_annotation(self):
+        mismatched = Order.objects.with_totals().exclude(
+            subtotal=F('computed_subtotal'),
+            discount_total=F('computed_discount_total'),
+            line_count=F('computed_line_count'),
+        )
+
+        self.assertFalse(mismatched.exists())
+
+    def test_detail_writes_keep_totals_in_sync(self):
+        order = Order.objects.get(pk=10248)
+        detail = OrderDetail.objects.create(
+            orderID=order, productID=Product.objects.get(pk=1),
+            unitPrice=Decimal('10.00'), quantity=2, discount=Decimal('0.50'),
+        )
+        order.refresh_from_db()
+        self.assertEqual((order.subtotal, order.discount_total, order.line_count),
+                         (Decimal('460.00'), Decimal('10.0000'), 4))
+
+        detail.delete()
+        order.refresh_from_db()
+        self.assertEqual((order.subtotal, order.line_count), (Decimal('440.00'), 3))
+
+    def refreshes(self, queries):
+        return [q for q in queries if q.sql.startswith('UPDATE "trader_order" ')]
+
+    def test_deleting_orders_does_not_refresh_them(self):
+        with capture_queries() as queries:
+            Order.objects.get(pk=10248).delete()
+            Customer.objects.get(pk='ALFKI').delete()
+        self.assertEqual(self.refreshes(queries), [])
+
+    def test_deleting_a_product_refreshes_each_order_once(self):
+        orders = set(OrderDetail.objects.filter(productID=11).values_list('orderID', flat=True))
+        with capture_queries() as queries:
+            Product.objects.get(pk=11).delete()
+
+        self.assertEqual(len(self.refreshes(queries)), len(orders))
+        self.assertFalse(Order.objects.with_totals().exclude(line_count=F('computed_line_count')).exists())
+
+
+@without_profilers
+class SalesAnalyticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_northwind()
+        refresh_rollup()
+
+    def test_rollup_matches_live_aggregation(self):
+        for report in REPORTS:
+            with self.subTest(report=report):
+                self.assertEqual(list(rollup_revenue(report)), list(live_revenue(report)))
+
+    def test_refresh_only_rebuilds_days_of_new_orders(self):
+        order = Order.objects.create(
+            orderID=20000, customerID=Customer.objects.get(pk='ALFKI'),
+            orderDate=date(2015, 6, 1), requiredDate=date(2015, 6, 15),
+        )
+        OrderDetail.objects.create(orderID=order, productID=Product.objects.get(pk=1),
+                                   unitPrice=Decimal('10.00'), quantity=3)
+
+        self.assertEqual(refresh_rollup(), 1)
+        self.assertEqual(refresh_rollup(), 0)
+        self.assertEqual(
+            DailySales.objects.get(day=date(2015, 6, 1), dimension='total').revenue, Decimal('30.00')
+        )
+
+    def test_refresh_rebuilds_days_of_changed_orders(self):
+        detail = OrderDetail.objects.filter(orderID=10248).first()
+        detail.quantity += 10
+        detail.save()
+        Order.objects.get(pk=10249).delete()
+        order = Order.objects.get(pk=10250)
+        order.orderDate = date(2015, 6, 2)
+        order.save()
+
+        # 10248's, 10249's, and 10250's old and new day
+        self.assertEqual(refresh_rollup(), 4)
+        self.assertEqual(refresh_rollup(), 0)
+        for report in REPORTS:
+            with self.subTest(report=report):
+                self.assertEqual(list(rollup_revenue(report)), list(live_revenue(report)))
+
+    def test_orders_without_employee_have_a_null_key(self):
+        day = date(2013, 7, 4)
+        Order.objects.filter(orderDate=day).update(employeeID=None)
+        refresh_rollup(days=[day])
+
+        rows = list(rollup_revenue('employee', day, day))
+        self.assertEqual(rows, list(live_revenue('employee', day, day)))
+        self.assertEqual((rows[0]['key'], rows[0]['label']), (None, None))
+
+    def test_endpoint(self):
+        url = reverse('sales-revenue', args=['month'])
+        response = self.client.get(url, {'start': '2014-01-01', 'end': '2014-12-31'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(self.client.get(reverse('sales-revenue', args=['planet'])).status_code, 404)
+        self.assertEqual(self.client.get(url, {'start': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'source': 'cache'}).status_code, 400)
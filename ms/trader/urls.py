@@ -33,4 +33,10 @@ urlpatterns = [
     
     # REQ 10: Non-Indexed Search (Slow)
     path('10-test-non-indexed-search/', views.ProductNonIndexedTest.as_view(), name='test-non-indexed-search'),
+
+    # Type-ahead over product, category and customer names (in memory)
+    path('autocomplete/', views.Autocomplete.as_view(), name='autocomplete'),
+
+    # Sales analytics: revenue by product/category/employee/country/month
+    path('analytics/revenue/<str:report>/', views.SalesRevenue.as_view(), name='sales-revenue'),
 ]
\ No newline at end of file
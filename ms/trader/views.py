@@ -1,55 +1,111 @@
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Order, Product, Category
+from . import autocomplete, profiling
+from .analytics import REPORTS, live_revenue, rollup_revenue
+from .caching import CachedResponseMixin
+from .conditional import ConditionalGetMixin
+from .models import Order, OrderDetail, Product, Category, Customer, Employee, Shipper
+from .pagination import OrderKeysetPagination
+from .search import ranked, search_products
+from .streaming import StreamingListMixin, streaming_json_response, wants_stream
 from .serializers import (
     OrderSerializer, ProductSerializer, CategorySerializer,
     ProductLightSerializer, CategoryLightSerializer
 )
 from django.db.models import Q, F
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_http_methods
+from django.utils.dateparse import parse_date
 
 # 
 # The "N+1 Problem" (Bad Performance)
 # 
 class OrderListUnoptimized(generics.ListAPIView):
     serializer_class = OrderSerializer
+    pagination_class = OrderKeysetPagination
     # Unoptimized: This query is the problem.
     queryset = Order.objects.all()
 
 
 #  The "N+1" Fix (Good Performance)
 
-class OrderListOptimized(generics.ListAPIView):
+class OrderListOptimized(ConditionalGetMixin, CachedResponseMixin, StreamingListMixin, generics.ListAPIView):
     serializer_class = OrderSerializer
+    # Pages are cached until one of these models is written to, and clients
+    # holding the current ETag get a 304 without any query
+    cache_models = (Order, OrderDetail, Product, Customer, Employee, Shipper)
+    # Keyset pagination on (orderDate, orderID): no COUNT(*), no OFFSET,
+    # so deep pages are as cheap as the first one
+    pagination_class = OrderKeysetPagination
     # Optimized: Using select_related (for 'one') and prefetch_related (for 'many')
     # to reduce N+1 problem
     # this is much better as it will reduce the number of quiries that need to be made to the database to get the data
     # This is the "N+1" fix
+    # ?stream sends the full order history as a streamed JSON array instead
     queryset = Order.objects.select_related(
         'customerID', 'employeeID', 'shipperID'
     ).prefetch_related(
         'order_details__productID'
     )
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?customer=ALFKI: one customer's orders, read from
+        # order_customer_date_idx in the same (orderDate, orderID) order
+        customer = self.request.query_params.get('customer')
+        if customer:
+            queryset = queryset.filter(customerID=customer)
+        return queryset
+
 
 # Dynamic "OR" search with Q()
 
-class ProductSearchQ(generics.ListAPIView):
+class ProductSearchQ(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
+    cache_models = (Product, Category)
 
     # Dynamic "OR" search with Q()
     # This is the "N+1" fix as well
 
     def get_queryset(self):
         term = self.request.query_params.get('search')
+        products = Product.objects.all().select_related('categoryID')
         if term:
+            # Full-text index on product and category names, best match
+            # first (see trader/search.py); LIKE '%term%' can't use an index
+            product_ids = search_products(term)
+            if product_ids is not None:
+                return ranked(products, product_ids)
             # Dynamic Q() 'OR' search on product name or category name
-            return Product.objects.filter(
+            return products.filter(
                 Q(productName__icontains=term) |
                 Q(categoryID__categoryName__icontains=term)
-            ).select_related('categoryID')
+            )
         
-        return Product.objects.all().select_related('categoryID')
+        return products
+
+
+# Type-ahead suggestions from the in-memory index
+
+class Autocomplete(APIView):
+    """
+    Product, category and customer names matching what has been typed so far.
+    Test with: /api/autocomplete/?q=cha  (&type=product,customer  &limit=10)
+    Answered from memory (see trader/autocomplete.py), no SQL at all unless
+    the index is still loading.
+    """
+    def get(self, request):
+        term = request.query_params.get('q', '')
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+        unknown = set(kinds) - set(autocomplete.KINDS)
+        if unknown:
+            return Response({'error': f'Unknown type, use one of: {", ".join(autocomplete.KINDS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = request.query_params.get('limit', '')
+        limit = min(int(limit), autocomplete.MAX_LIMIT) if limit.isdigit() else autocomplete.DEFAULT_LIMIT
+        results, source = autocomplete.suggest(term, kinds or None, limit)
+        return Response({'query': term, 'source': source, 'results': results})
 
 
 # Atomic "UPDATE" with F()
@@ -69,25 +125,27 @@ class ProductIncreasePriceF(APIView):
 
 
 #  Select specific fields with .only()
-class ProductListOnly(generics.ListAPIView):
+class ProductListOnly(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
 
     """
     Uses .only() to select just the 3 fields in the serializer.
     This saves memory and bandwidth.
     """
     serializer_class = ProductLightSerializer
+    cache_models = (Product,)
     # Optimized: use .only() to select just the 3 fields in the serializer
     queryset = Product.objects.only('productID', 'productName', 'unitPrice')
 
 
  # Skip specific fields with .defer()
 
-class CategoryListDefer(generics.ListAPIView):
+class CategoryListDefer(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     """
     Uses .defer() to skip a large text field ('description').
     This saves memory and bandwidth.
     """
     serializer_class = CategoryLightSerializer
+    cache_models = (Category,)
     # Optimized: use .defer() to skip the 'description' field
     queryset = Category.objects.defer('description')
 
@@ -101,6 +159,8 @@ class ProductListValues(APIView):
     def get(self, request):
         # Optimized: .values() returns a list of dictionaries
         data = Product.objects.values('productID', 'productName', 'unitPrice')
+        if wants_stream(request):
+            return streaming_json_response(data.iterator(chunk_size=2000))
         return Response(list(data))
 
 
@@ -114,6 +174,8 @@ class ProductListValuesList(APIView):
     def get(self, request):
         # Optimized: .values_list() returns a list of tuples
         data = Product.objects.values_list('productID', 'productName', 'unitPrice')
+        if wants_stream(request):
+            return streaming_json_response(data.iterator(chunk_size=2000))
         return Response(list(data))
 
 
@@ -143,4 +205,65 @@ class ProductNonIndexedTest(generics.ListAPIView):
     def get_queryset(self):
         term = self.request.query_params.get('term', '10 boxes x 20 bags')
         # This lookup is SLOW because 'quantityPerUnit' is not indexed
-        return Product.objects.filter(quantityPerUnit=term)
\ No newline at end of file
+        return Product.objects.filter(quantityPerUnit=term)
+
+
+# Sales analytics (aggregated in the database)
+
+class SalesRevenue(APIView):
+    """
+    Revenue, quantity and line count per product, category, employee,
+    customer country or month.
+    Test with: /api/analytics/revenue/category/?start=2014-01-01&end=2014-12-31
+    By default the figures come from the DailySales rollup; ?source=live
+    aggregates OrderDetail directly instead (same numbers, more work).
+    """
+    def get(self, request, report):
+        if report not in REPORTS:
+            return Response({'error': f'Unknown report, use one of: {", ".join(REPORTS)}'},
+                            status=status.HTTP_404_NOT_FOUND)
+        try:
+            start, end = (self._date(request, name) for name in ('start', 'end'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        source = request.query_params.get('source', 'rollup')
+        if source not in ('rollup', 'live'):
+            return Response({'error': 'Unknown source, use rollup or live'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        rows = (live_revenue if source == 'live' else rollup_revenue)(report, start, end)
+        limit = request.query_params.get('limit')
+        if limit and limit.isdigit():
+            rows = rows[:int(limit)]
+        return Response({'report': report, 'source': source, 'results': list(rows)})
+
+    @staticmethod
+    def _date(request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+        return parsed
+
+
+# Sampling profiler (see trader.profiling), mounted in the admin
+
+@require_http_methods(['GET', 'POST'])
+def sampled_profile(request):
+    """
+    GET: the collapsed stacks of every profiled route (?route= for one),
+    ready for flamegraph.pl or speedscope; ?summary for requests and
+    samples per route as JSON. POST: start over.
+    """
+    if request.method == 'POST':
+        profiling.clear()
+        return HttpResponse(status=204)
+    samples = profiling.collect()
+    if 'summary' in request.GET:
+        return JsonResponse({route: {'requests': requests, 'samples': count}
+                             for route, (requests, count) in samples.summary().items()})
+    response = HttpResponse(samples.collapsed(request.GET.get('route')), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="profile.folded"'
+    return response